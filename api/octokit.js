@@ -28,7 +28,7 @@ class OctoKit {
         return this._octokit;
     }
     getIssueByNumber(number) {
-        return new OctoKitIssue(this.token, this.params, { number: number });
+        return new OctoKitIssue(this.token, this.params, { number: number }, this.options);
     }
     // TODO: just iterate over the issues in a page here instead of making caller do it
     async *query(query) {
@@ -243,6 +243,16 @@ class OctoKitIssue extends OctoKit {
             });
         }
     }
+    async addAssignees(assignees) {
+        (0, utils_1.safeLog)('Adding assignees ' + assignees.join(', ') + ' to ' + this.issueData.number);
+        if (!this.options.readonly) {
+            await this.octokit.rest.issues.addAssignees({
+                ...this.params,
+                issue_number: this.issueData.number,
+                assignees,
+            });
+        }
+    }
     async removeAssignee(assignee) {
         (0, utils_1.safeLog)('Removing assignee ' + assignee + ' to ' + this.issueData.number);
         if (!this.options.readonly) {
@@ -359,6 +369,16 @@ class OctoKitIssue extends OctoKit {
                 labels: [name],
             });
     }
+    // Unlike addLabel, the caller is expected to have checked that the labels exist.
+    async addLabels(names) {
+        (0, utils_1.safeLog)(`Adding labels ${names.join(', ')} to ${this.issueData.number}`);
+        if (!this.options.readonly)
+            await this.octokit.rest.issues.addLabels({
+                ...this.params,
+                issue_number: this.issueData.number,
+                labels: names,
+            });
+    }
     async getAssigner(assignee) {
         var _a, _b;
         const options = {
@@ -37,7 +37,7 @@ export class OctoKit implements GitHub {
 	}
 
 	getIssueByNumber(number: number) {
-		return new OctoKitIssue(this.token, this.params, { number: number });
+		return new OctoKitIssue(this.token, this.params, { number: number }, this.options);
 	}
 
 	// TODO: just iterate over the issues in a page here instead of making caller do it
@@ -277,6 +277,17 @@ export class OctoKitIssue extends OctoKit implements GitHubIssue {
 		}
 	}
 
+	async addAssignees(assignees: string[]): Promise<void> {
+		safeLog('Adding assignees ' + assignees.join(', ') + ' to ' + this.issueData.number);
+		if (!this.options.readonly) {
+			await this.octokit.rest.issues.addAssignees({
+				...this.params,
+				issue_number: this.issueData.number,
+				assignees,
+			});
+		}
+	}
+
 	async removeAssignee(assignee: string): Promise<void> {
 		safeLog('Removing assignee ' + assignee + ' to ' + this.issueData.number);
 		if (!this.options.readonly) {
@@ -405,6 +416,17 @@ export class OctoKitIssue extends OctoKit implements GitHubIssue {
 			});
 	}
 
+	// Unlike addLabel, the caller is expected to have checked that the labels exist.
+	async addLabels(names: string[]): Promise<void> {
+		safeLog(`Adding labels ${names.join(', ')} to ${this.issueData.number}`);
+		if (!this.options.readonly)
+			await this.octokit.rest.issues.addLabels({
+				...this.params,
+				issue_number: this.issueData.number,
+				labels: names,
+			});
+	}
+
 	async getAssigner(assignee: string): Promise<string> {
 		const options = {
 			...this.params,
@@ -7,33 +7,37 @@ from simpletransformers.classification import ClassificationModel
 import json
 import os.path
 import logging
+import time
+import sys
 
 BASE_PATH = os.path.join(os.path.dirname(__file__), "..")
 
+# The input batching shared with threshold calibration on the training VM.
+sys.path.insert(0, os.path.join(BASE_PATH, "..", "train", "vm-filesystem", "classifier"))
+from inputs import predict_bucketed, format_stats
+
 logging.basicConfig(level=logging.WARN)
 transformers_logger = logging.getLogger("transformers")
 transformers_logger.setLevel(logging.WARN)
 
-def make_classifier(category, config, default_target_accuracy):
-    with open(os.path.join(BASE_PATH, category+'_model', 'target_names.json')) as fp:
+def make_classifier(category, config, default_target_accuracy, model_path=BASE_PATH, baseline=False):
+    model_dir = os.path.join(model_path, category+'_model')
+
+    with open(os.path.join(model_dir, 'target_names.json')) as fp:
         target_names = json.load(fp)
 
-    with open(os.path.join(BASE_PATH, category+'_model', 'thresholds.json')) as fp:
+    with open(os.path.join(model_dir, 'thresholds.json')) as fp:
         thresholds = json.load(fp)
 
     model = ClassificationModel(
         'bert',
-        os.path.join(BASE_PATH, category+'_model'),
+        model_dir,
         num_labels=len(target_names),
         use_cuda=False
     )
 
-    def classify(issue_body):
-        predictions, raw_outputs = model.predict([issue_body])
-
-        raw_output = raw_outputs[0]
-        prediction_index = predictions[0]
-        prediction_name = target_names[predictions[0]]
+    def classify_one(prediction_index, raw_output):
+        prediction_name = target_names[prediction_index]
         prediction_config = config.get(prediction_name, {})
 
 
@@ -60,33 +64,58 @@ def make_classifier(category, config, default_target_accuracy):
         else:
             return {'confident': True, 'category': prediction_name, 'confidence': confidence_estimate}
 
+    def classify(issue_bodies):
+        predictions, raw_outputs, stats = predict_bucketed(model, issue_bodies, baseline=baseline)
+        print(category + ":", format_stats(stats))
+        return [
+            classify_one(prediction_index, raw_output)
+            for prediction_index, raw_output in zip(predictions, raw_outputs)
+        ]
+
     return classify
 
 
-def main():
+def main(data_path=BASE_PATH, model_path=BASE_PATH, baseline=False):
+    """Label data_path/issue_data.json into data_path/issue_labels.json.
+
+    The <category>_model directories are read from model_path. With baseline,
+    also times unbucketed prediction of the issues. Returns the seconds each
+    category's model took to load.
+    """
     results = []
+    load_seconds = {}
 
-    with open(os.path.join(BASE_PATH, "configuration.json")) as f:
+    with open(os.path.join(data_path, "configuration.json")) as f:
         configuration = json.load(f)
 
-    area_classifier = make_classifier('area', configuration.get('labels', {}), 0.70)
-    assignee_classifier = make_classifier('assignee', configuration.get('assignees', {}), 0.75)
+    start = time.perf_counter()
+    area_classifier = make_classifier('area', configuration.get('labels', {}), 0.70, model_path, baseline)
+    load_seconds['area'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assignee_classifier = make_classifier('assignee', configuration.get('assignees', {}), 0.75, model_path, baseline)
+    load_seconds['assignee'] = time.perf_counter() - start
 
-    with open(os.path.join(BASE_PATH, "issue_data.json")) as f:
+    with open(os.path.join(data_path, "issue_data.json")) as f:
         issue_data = json.load(f)
-        for issue in issue_data:
+        contents = [issue["contents"] for issue in issue_data]
+        areas = area_classifier(contents)
+        assignees = assignee_classifier(contents)
+        for issue, area, assignee in zip(issue_data, areas, assignees):
             results.append(
                 {
                     "number": issue["number"],
-                    "area": area_classifier(issue["contents"]),
-                    "assignee": assignee_classifier(issue["contents"]),
+                    "area": area,
+                    "assignee": assignee,
                     "contents": issue["contents"],
                 }
             )
 
-    with open(os.path.join(BASE_PATH, "issue_labels.json"), "w") as f:
+    with open(os.path.join(data_path, "issue_labels.json"), "w") as f:
         json.dump(results, f)
 
+    return load_seconds
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,332 @@
+# ---------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License. See LICENSE in the project root for license information.
+# ---------------------------------------------------------------------------------------------
+
+# Offline benchmark of the deep classifier on a CPU-only machine. Builds tiny,
+# randomly initialized BERT models with matching target_names.json, calibrates
+# their thresholds.json with generateConfigurations.py on synthetic issues,
+# then runs apply/generate-labels/main.py over more synthetic issues. Reports
+# issues per second, model load time and peak RSS of each phase.
+#
+# Needs the Python packages of the training VM (simpletransformers, torch and
+# nltk, see provision-vm.sh) but no GPU, network access or trained models.
+#
+# With --baseline, every batch is also predicted the unbucketed way and the
+# time saved is printed. That time counts towards the phase it is taken in.
+#
+# Usage: python benchmark.py [--issues N] [--baseline] [--output results.json]
+
+from simpletransformers.classification import ClassificationArgs
+from transformers import BertConfig, BertForSequenceClassification, BertTokenizer
+from queue import Empty
+import multiprocessing as mp
+import numpy as np
+import argparse
+import resource
+import tempfile
+import shutil
+import string
+import json
+import time
+import sys
+import os
+
+import torch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APPLY_DIR = os.path.join(HERE, "..", "apply", "generate-labels")
+TRAIN_DIR = os.path.join(HERE, "..", "train", "vm-filesystem", "classifier")
+
+# Number of labels of each category's model.
+CATEGORIES = {"area": 40, "assignee": 20}
+
+SEED = 0
+
+# Seconds between checks that a phase's process is still running.
+POLL_SECONDS = 5
+
+# A bert-base layout shrunk so that models build in seconds. Relative timings
+# of batching, truncation and caching changes carry over to full size models.
+MODEL_CONFIG = {
+    "hidden_size": 64,
+    "num_hidden_layers": 2,
+    "num_attention_heads": 2,
+    "intermediate_size": 256,
+    "max_position_embeddings": 512,
+}
+
+# The arguments generateModels.py saves with a trained model, as far as they
+# affect prediction.
+MODEL_ARGS = {"max_seq_length": 256, "eval_batch_size": 32}
+
+VOCAB_WORDS = 5000
+
+# Issue lengths in characters are log-normal around MEDIAN_CHARS. LOG_RATE of
+# issues also paste a log, which makes for the long tail of very long issues.
+MEDIAN_CHARS = 600
+LENGTH_SIGMA = 0.9
+LOG_RATE = 0.15
+LOG_LINES = (20, 400)
+
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ed", "it", "or", "un"]
+
+
+def make_words(rng, count):
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(SYLLABLES, size=rng.randint(1, 5))))
+    return sorted(words)
+
+
+def write_vocab(path, words):
+    chars = list(string.ascii_lowercase + string.digits + string.punctuation)
+    vocab = SPECIAL_TOKENS + words + chars + ["##" + c for c in chars]
+    with open(path, "w") as f:
+        f.write("\n".join(vocab) + "\n")
+    return len(vocab)
+
+
+class IssueGenerator:
+    """Synthetic issues, with Zipf distributed words and realistic lengths."""
+
+    def __init__(self, words, seed=SEED):
+        self.rng = np.random.RandomState(seed)
+        self.words = np.array(words)
+        weights = 1 / np.arange(1, len(words) + 1)
+        self.weights = weights / weights.sum()
+
+    def text(self, chars):
+        # Words average about 6 characters with their separating space.
+        words = self.rng.choice(self.words, size=chars // 6 + 1, p=self.weights)
+        return " ".join(words)[:chars]
+
+    def log(self):
+        lines = []
+        for _ in range(self.rng.randint(*LOG_LINES)):
+            module, function = self.rng.choice(self.words, size=2)
+            lines.append(
+                "at {0}.{1} ({0}.js:{2}:{3})".format(
+                    module,
+                    function,
+                    self.rng.randint(1, 5000),
+                    self.rng.randint(1, 120),
+                )
+            )
+        return "\n".join(lines)
+
+    def issue(self):
+        chars = int(self.rng.lognormal(np.log(MEDIAN_CHARS), LENGTH_SIGMA))
+        title = self.text(self.rng.randint(20, 80))
+        body = self.text(chars)
+        if self.rng.rand() < LOG_RATE:
+            body += "\n\n```\n" + self.log() + "\n```"
+        return title + "\n\n" + body
+
+
+def target_names(category):
+    return ["{0}-{1:02d}".format(category, i) for i in range(CATEGORIES[category])]
+
+
+def build_model(model_dir, category, vocab_path, vocab_size):
+    names = target_names(category)
+    os.makedirs(model_dir, exist_ok=True)
+
+    torch.manual_seed(SEED)
+    config = BertConfig(vocab_size=vocab_size, num_labels=len(names), **MODEL_CONFIG)
+    BertForSequenceClassification(config).save_pretrained(model_dir)
+    BertTokenizer(vocab_path, do_lower_case=True).save_pretrained(model_dir)
+    ClassificationArgs(**MODEL_ARGS).save(model_dir)
+
+    with open(os.path.join(model_dir, "target_names.json"), "w") as f:
+        json.dump(names, f)
+
+
+def write_train_data(train_dir, category, generator, count):
+    # Round robin, so that every label has test issues to calibrate on.
+    names = target_names(category)
+    data_dir = os.path.join(train_dir, "train_data", category)
+    for i in range(count):
+        label_dir = os.path.join(data_dir, names[i % len(names)])
+        os.makedirs(label_dir, exist_ok=True)
+        with open(os.path.join(label_dir, str(i) + ".txt"), "w") as f:
+            f.write(generator.issue())
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def calibrate(queue, train_dir, baseline):
+    os.chdir(train_dir)
+    sys.path.insert(0, TRAIN_DIR)
+    from generateConfigurations import calibrate_category
+    from dataset import logits_path
+
+    result = {"categories": {}}
+    start = time.perf_counter()
+    for category in CATEGORIES:
+        category_start = time.perf_counter()
+        thresholds = calibrate_category(category, use_cuda=False, baseline=baseline)
+        seconds = time.perf_counter() - category_start
+        with open(os.path.join(category + "_model", "thresholds.json"), "w") as fp:
+            json.dump(thresholds, fp)
+
+        examples = len(np.load(logits_path(category))["labels"])
+        result["categories"][category] = {
+            "examples": examples,
+            "seconds": seconds,
+            "examples_per_second": examples / seconds,
+        }
+    result["seconds"] = time.perf_counter() - start
+    result["peak_rss_mb"] = peak_rss_mb()
+    queue.put(result)
+
+
+def apply(queue, apply_dir, baseline):
+    sys.path.insert(0, APPLY_DIR)
+    import main
+
+    start = time.perf_counter()
+    load_seconds = main.main(
+        data_path=apply_dir, model_path=apply_dir, baseline=baseline
+    )
+    seconds = time.perf_counter() - start
+
+    with open(os.path.join(apply_dir, "issue_labels.json")) as f:
+        issues = len(json.load(f))
+
+    classify_seconds = seconds - sum(load_seconds.values())
+    queue.put(
+        {
+            "issues": issues,
+            "seconds": seconds,
+            "load_seconds": load_seconds,
+            "classify_seconds": classify_seconds,
+            "issues_per_second": issues / classify_seconds,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    )
+
+
+def run_phase(context, target, *args):
+    # Each phase runs in a fresh process, so its peak RSS is its own. Not a
+    # Pool worker, as those may not start the processes simpletransformers uses.
+    queue = context.Queue()
+    process = context.Process(target=target, args=(queue,) + args)
+    process.start()
+    try:
+        while True:
+            try:
+                return queue.get(timeout=POLL_SECONDS)
+            except Empty:
+                if process.exitcode is not None:
+                    break
+
+        # The result may still be in flight from a process that just exited.
+        try:
+            return queue.get(timeout=POLL_SECONDS)
+        except Empty:
+            raise RuntimeError(
+                "{0} phase exited with code {1}, see its traceback above".format(
+                    target.__name__, process.exitcode
+                )
+            ) from None
+    finally:
+        process.join()
+
+
+def print_report(results):
+    calibration = results["calibration"]
+    print(
+        "Calibration: {0:.1f}s, peak RSS {1:.0f} MB".format(
+            calibration["seconds"], calibration["peak_rss_mb"]
+        )
+    )
+    for category, stats in calibration["categories"].items():
+        print(
+            "  {0}: {1} examples, {2:.1f} examples/s".format(
+                category, stats["examples"], stats["examples_per_second"]
+            )
+        )
+
+    labels = results["apply"]
+    print(
+        "Apply: {0} issues in {1:.1f}s, peak RSS {2:.0f} MB".format(
+            labels["issues"], labels["seconds"], labels["peak_rss_mb"]
+        )
+    )
+    for category, seconds in labels["load_seconds"].items():
+        print("  {0} model load: {1:.2f}s".format(category, seconds))
+    print("  {0:.1f} issues/s".format(labels["issues_per_second"]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--issues", type=int, default=1000)
+    parser.add_argument("--calibration-issues", type=int, default=1000)
+    parser.add_argument(
+        "--baseline",
+        action="store_true",
+        help="also time unbucketed prediction, which slows both phases",
+    )
+    parser.add_argument(
+        "--workdir", help="kept after the run, instead of a temporary directory"
+    )
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="deep-classifier-benchmark-")
+    train_dir = os.path.join(workdir, "train")
+    apply_dir = os.path.join(workdir, "apply")
+    # Logits, packed data and issues left by an earlier run in --workdir would
+    # be reused, so every run starts from empty directories.
+    for path in (train_dir, apply_dir):
+        shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(train_dir, exist_ok=True)
+    os.makedirs(apply_dir, exist_ok=True)
+
+    try:
+        words = make_words(np.random.RandomState(SEED), VOCAB_WORDS)
+        vocab_path = os.path.join(workdir, "vocab.txt")
+        vocab_size = write_vocab(vocab_path, words)
+        generator = IssueGenerator(words)
+
+        for category in CATEGORIES:
+            model_dir = os.path.join(train_dir, category + "_model")
+            build_model(model_dir, category, vocab_path, vocab_size)
+            write_train_data(train_dir, category, generator, args.calibration_issues)
+
+        context = mp.get_context("spawn")
+        results = {
+            "calibration": run_phase(context, calibrate, train_dir, args.baseline)
+        }
+
+        # Calibrated models, as generate-labels downloads them in production.
+        for category in CATEGORIES:
+            shutil.copytree(
+                os.path.join(train_dir, category + "_model"),
+                os.path.join(apply_dir, category + "_model"),
+                dirs_exist_ok=True,
+            )
+        with open(os.path.join(apply_dir, "configuration.json"), "w") as f:
+            json.dump({}, f)
+        with open(os.path.join(apply_dir, "issue_data.json"), "w") as f:
+            issues = range(args.issues)
+            json.dump([{"number": i, "contents": generator.issue()} for i in issues], f)
+
+        results["apply"] = run_phase(context, apply, apply_dir, args.baseline)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
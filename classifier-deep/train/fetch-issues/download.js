@@ -4,17 +4,80 @@
  *  Licensed under the MIT License. See LICENSE in the project root for license information.
  *--------------------------------------------------------------------------------------------*/
 Object.defineProperty(exports, "__esModule", { value: true });
-exports.download = void 0;
+exports.sync = exports.download = void 0;
 const axios_1 = require("axios");
 const fs_1 = require("fs");
 const path_1 = require("path");
 const Action_1 = require("../../../common/Action");
+const issueSync_1 = require("../../../common/issueSync");
 const utils_1 = require("../../../common/utils");
+const GRAPHQL_URL = 'https://api.github.com/graphql';
+const issueFields = `
+    body
+    title
+    number
+    createdAt
+    updatedAt
+    userContentEdits(first: 100) {
+      nodes {
+        editedAt
+        diff
+      }
+    }
+    assignees(first: 100) {
+      nodes {
+        login
+      }
+    }
+    labels(first: 100) {
+      nodes {
+        name
+        color
+      }
+    }
+    timelineItems(itemTypes: [LABELED_EVENT, RENAMED_TITLE_EVENT, UNLABELED_EVENT, CLOSED_EVENT], first: 100) {
+      nodes {
+        __typename
+        ... on UnlabeledEvent {
+          createdAt
+          label { name }
+        }
+        ... on LabeledEvent {
+          createdAt
+          label { name }
+          actor { login }
+        }
+        ... on RenamedTitleEvent {
+          createdAt
+          currentTitle
+          previousTitle
+        }
+        ... on ClosedEvent {
+          __typename
+        }
+      }
+    }
+`;
+const toJSONOutputLine = (issue) => ({
+    number: issue.number,
+    title: issue.title,
+    body: issue.body,
+    createdAt: +new Date(issue.createdAt),
+    updatedAt: +new Date(issue.updatedAt),
+    labels: issue.labels.nodes.map((label) => ({ name: label.name, color: label.color })),
+    assignees: issue.assignees.nodes.map((assignee) => assignee.login),
+    labelEvents: extractLabelEvents(issue),
+    closedWithCode: !!issue.timelineItems.nodes.find((event) => {
+        var _a, _b;
+        return event.__typename === 'ClosedEvent' &&
+            (((_a = event.closer) === null || _a === void 0 ? void 0 : _a.__typename) === 'PullRequest' || ((_b = event.closer) === null || _b === void 0 ? void 0 : _b.__typename) === 'Commit');
+    }),
+});
 const download = async (repo, startCursor, isRetry = false) => {
     var _a, _b;
     const token = await (0, Action_1.getAuthenticationToken)();
     const data = await axios_1.default
-        .post('https://api.github.com/graphql', {
+        .post(GRAPHQL_URL, {
         query: `{
       repository(name: "${repo.repo}", owner: "${repo.owner}") {
         issues(last: 100 ${startCursor ? `before: "${startCursor}"` : ''}) {
@@ -23,55 +86,14 @@ const download = async (repo, startCursor, isRetry = false) => {
             hasPreviousPage
           }
           nodes {
-            body
-            title
-            number
-            createdAt
-            userContentEdits(first: 100) {
-              nodes {
-                editedAt
-                diff
-              }
-            }
-            assignees(first: 100) {
-              nodes {
-                login
-              }
-            }
-            labels(first: 100) {
-              nodes {
-                name
-                color
-              }
-            }
-            timelineItems(itemTypes: [LABELED_EVENT, RENAMED_TITLE_EVENT, UNLABELED_EVENT, CLOSED_EVENT], first: 100) {
-              nodes {
-                __typename
-                ... on UnlabeledEvent {
-                  createdAt
-                  label { name }
-                }
-                ... on LabeledEvent {
-                  createdAt
-                  label { name }
-                  actor { login }
-                }
-                ... on RenamedTitleEvent {
-                  createdAt
-                  currentTitle
-                  previousTitle
-                }
-                ... on ClosedEvent {
-                  __typename
-                }
-              }
-            }
+            ${issueFields}
           }
         }
       }
       rateLimit {
         cost
         remaining
+        resetAt
       }
     }`,
     }, {
@@ -97,20 +119,7 @@ const download = async (repo, startCursor, isRetry = false) => {
             }, 60000);
         });
     }
-    const issues = response.repository.issues.nodes.map((issue) => ({
-        number: issue.number,
-        title: issue.title,
-        body: issue.body,
-        createdAt: +new Date(issue.createdAt),
-        labels: issue.labels.nodes.map((label) => ({ name: label.name, color: label.color })),
-        assignees: issue.assignees.nodes.map((assignee) => assignee.login),
-        labelEvents: extractLabelEvents(issue),
-        closedWithCode: !!issue.timelineItems.nodes.find((event) => {
-            var _a, _b;
-            return event.__typename === 'ClosedEvent' &&
-                (((_a = event.closer) === null || _a === void 0 ? void 0 : _a.__typename) === 'PullRequest' || ((_b = event.closer) === null || _b === void 0 ? void 0 : _b.__typename) === 'Commit');
-        }),
-    }));
+    const issues = response.repository.issues.nodes.map(toJSONOutputLine);
     (0, fs_1.writeFileSync)((0, path_1.join)(__dirname, 'issues.json'), issues.map((issue) => JSON.stringify(issue)).join('\n') + '\n', {
         flag: 'a',
     });
@@ -132,6 +141,61 @@ const download = async (repo, startCursor, isRetry = false) => {
     }
 };
 exports.download = download;
+/**
+ * Bring issues.json up to date with the issues updated since the previous sync,
+ * merging them in by issue number. Without a previous sync, every issue is fetched.
+ * An interrupted sync resumes from its last fetched pages.
+ */
+const sync = async (repo, { dir = __dirname, endpoint = GRAPHQL_URL, token, ...options } = {}) => {
+    const authToken = token || (await (0, Action_1.getAuthenticationToken)());
+    const graphql = async (query) => {
+        const data = await axios_1.default
+            .post(endpoint, { query }, {
+            headers: {
+                'Content-Type': 'application/json',
+                Accept: 'application/json',
+                Authorization: 'bearer ' + authToken,
+                'User-Agent': 'github-actions://microsoft/vscode-github-triage-actions#fetch-issues',
+            },
+        })
+            .then((r) => r.data);
+        if (!data.data) {
+            throw Error('Unexpected GraphQL response: ' + JSON.stringify(data));
+        }
+        return data.data;
+    };
+    await (0, issueSync_1.syncIssues)(dir, async (window) => {
+        const after = window.cursor ? `after: "${window.cursor}"` : '';
+        const response = await graphql(`{
+      repository(name: "${repo.repo}", owner: "${repo.owner}") {
+        issues(first: 100 ${after} orderBy: {field: UPDATED_AT, direction: ASC}, filterBy: {since: "${window.since}"}) {
+          pageInfo {
+            endCursor
+            hasNextPage
+          }
+          nodes {
+            ${issueFields}
+          }
+        }
+      }
+      rateLimit {
+        cost
+        remaining
+        resetAt
+      }
+    }`);
+        return {
+            issues: response.repository.issues.nodes.map(toJSONOutputLine),
+            endCursor: response.repository.issues.pageInfo.endCursor,
+            hasNextPage: response.repository.issues.pageInfo.hasNextPage,
+            rateLimit: response.rateLimit,
+        };
+    }, async () => {
+        const response = await graphql(`{ repository(name: "${repo.repo}", owner: "${repo.owner}") { createdAt } }`);
+        return response.repository.createdAt;
+    }, options);
+};
+exports.sync = sync;
 const extractLabelEvents = (_issue) => {
     var _a, _b, _c, _d;
     const issue = _issue;
@@ -7,13 +7,26 @@ import axios from 'axios';
 import { writeFileSync } from 'fs';
 import { join } from 'path';
 import { getAuthenticationToken } from '../../../common/Action';
+import { RateLimit, syncIssues, SyncOptions } from '../../../common/issueSync';
 import { safeLog } from '../../../common/utils';
 
+const GRAPHQL_URL = 'https://api.github.com/graphql';
+
 type Response = {
 	rateLimit: RateLimitResponse;
 	repository: { issues: IssueResponse };
 };
 
+type SyncResponse = {
+	rateLimit: RateLimit;
+	repository: {
+		issues: {
+			pageInfo: { endCursor: string | null; hasNextPage: boolean };
+			nodes: IssueResponse['nodes'];
+		};
+	};
+};
+
 type GHLabelEvent = {
 	createdAt: string;
 	__typename: 'LabeledEvent' | 'UnlabeledEvent';
@@ -32,7 +45,7 @@ type GHCloseEvent = {
 	closer: { __typename: 'Commit' | 'PullRequest' } | null;
 };
 
-type RateLimitResponse = { cost: number; remaining: number };
+type RateLimitResponse = { cost: number; remaining: number; resetAt: string };
 type IssueResponse = {
 	pageInfo: { startCursor: string; hasPreviousPage: boolean };
 	nodes: {
@@ -40,6 +53,7 @@ type IssueResponse = {
 		title: string;
 		number: number;
 		createdAt: number;
+		updatedAt: string;
 		userContentEdits: { nodes: { editedAt: string; diff: string }[] };
 		assignees: { nodes: { login: string }[] };
 		labels: { nodes: { name: string; color: string }[] };
@@ -54,6 +68,7 @@ export type JSONOutputLine = {
 	title: string;
 	body: string;
 	createdAt: number;
+	updatedAt: number;
 	labels: { name: string; color: string }[];
 	assignees: string[];
 	labelEvents: LabelEvent[];
@@ -75,6 +90,69 @@ export type RemovedLabelEvent = {
 	label: string;
 };
 
+const issueFields = `
+    body
+    title
+    number
+    createdAt
+    updatedAt
+    userContentEdits(first: 100) {
+      nodes {
+        editedAt
+        diff
+      }
+    }
+    assignees(first: 100) {
+      nodes {
+        login
+      }
+    }
+    labels(first: 100) {
+      nodes {
+        name
+        color
+      }
+    }
+    timelineItems(itemTypes: [LABELED_EVENT, RENAMED_TITLE_EVENT, UNLABELED_EVENT, CLOSED_EVENT], first: 100) {
+      nodes {
+        __typename
+        ... on UnlabeledEvent {
+          createdAt
+          label { name }
+        }
+        ... on LabeledEvent {
+          createdAt
+          label { name }
+          actor { login }
+        }
+        ... on RenamedTitleEvent {
+          createdAt
+          currentTitle
+          previousTitle
+        }
+        ... on ClosedEvent {
+          __typename
+        }
+      }
+    }
+`;
+
+const toJSONOutputLine = (issue: IssueResponse['nodes'][number]): JSONOutputLine => ({
+	number: issue.number,
+	title: issue.title,
+	body: issue.body,
+	createdAt: +new Date(issue.createdAt),
+	updatedAt: +new Date(issue.updatedAt),
+	labels: issue.labels.nodes.map((label) => ({ name: label.name, color: label.color })),
+	assignees: issue.assignees.nodes.map((assignee) => assignee.login),
+	labelEvents: extractLabelEvents(issue),
+	closedWithCode: !!issue.timelineItems.nodes.find(
+		(event) =>
+			event.__typename === 'ClosedEvent' &&
+			(event.closer?.__typename === 'PullRequest' || event.closer?.__typename === 'Commit'),
+	),
+});
+
 export const download = async (
 	repo: { owner: string; repo: string },
 	startCursor?: string,
@@ -83,7 +161,7 @@ export const download = async (
 	const token = await getAuthenticationToken();
 	const data = await axios
 		.post(
-			'https://api.github.com/graphql',
+			GRAPHQL_URL,
 			{
 				query: `{
       repository(name: "${repo.repo}", owner: "${repo.owner}") {
@@ -93,55 +171,14 @@ export const download = async (
             hasPreviousPage
           }
           nodes {
-            body
-            title
-            number
-            createdAt
-            userContentEdits(first: 100) {
-              nodes {
-                editedAt
-                diff
-              }
-            }
-            assignees(first: 100) {
-              nodes {
-                login
-              }
-            }
-            labels(first: 100) {
-              nodes {
-                name
-                color
-              }
-            }
-            timelineItems(itemTypes: [LABELED_EVENT, RENAMED_TITLE_EVENT, UNLABELED_EVENT, CLOSED_EVENT], first: 100) {
-              nodes {
-                __typename
-                ... on UnlabeledEvent {
-                  createdAt
-                  label { name }
-                }
-                ... on LabeledEvent {
-                  createdAt
-                  label { name }
-                  actor { login }
-                }
-                ... on RenamedTitleEvent {
-                  createdAt
-                  currentTitle
-                  previousTitle
-                }
-                ... on ClosedEvent {
-                  __typename
-                }
-              }
-            }
+            ${issueFields}
           }
         }
       }
       rateLimit {
         cost
         remaining
+        resetAt
       }
     }`,
 			},
@@ -172,20 +209,7 @@ export const download = async (
 		});
 	}
 
-	const issues: JSONOutputLine[] = response.repository.issues.nodes.map((issue) => ({
-		number: issue.number,
-		title: issue.title,
-		body: issue.body,
-		createdAt: +new Date(issue.createdAt),
-		labels: issue.labels.nodes.map((label) => ({ name: label.name, color: label.color })),
-		assignees: issue.assignees.nodes.map((assignee) => assignee.login),
-		labelEvents: extractLabelEvents(issue),
-		closedWithCode: !!issue.timelineItems.nodes.find(
-			(event) =>
-				event.__typename === 'ClosedEvent' &&
-				(event.closer?.__typename === 'PullRequest' || event.closer?.__typename === 'Commit'),
-		),
-	}));
+	const issues: JSONOutputLine[] = response.repository.issues.nodes.map(toJSONOutputLine);
 
 	writeFileSync(
 		join(__dirname, 'issues.json'),
@@ -215,6 +239,81 @@ export const download = async (
 	}
 };
 
+/**
+ * Bring issues.json up to date with the issues updated since the previous sync,
+ * merging them in by issue number. Without a previous sync, every issue is fetched.
+ * An interrupted sync resumes from its last fetched pages.
+ */
+export const sync = async (
+	repo: { owner: string; repo: string },
+	{
+		dir = __dirname,
+		endpoint = GRAPHQL_URL,
+		token,
+		...options
+	}: SyncOptions & { dir?: string; endpoint?: string; token?: string } = {},
+) => {
+	const authToken = token || (await getAuthenticationToken());
+	const graphql = async <T>(query: string): Promise<T> => {
+		const data = await axios
+			.post(
+				endpoint,
+				{ query },
+				{
+					headers: {
+						'Content-Type': 'application/json',
+						Accept: 'application/json',
+						Authorization: 'bearer ' + authToken,
+						'User-Agent': 'github-actions://microsoft/vscode-github-triage-actions#fetch-issues',
+					},
+				},
+			)
+			.then((r) => r.data);
+		if (!data.data) {
+			throw Error('Unexpected GraphQL response: ' + JSON.stringify(data));
+		}
+		return data.data;
+	};
+
+	await syncIssues(
+		dir,
+		async (window) => {
+			const after = window.cursor ? `after: "${window.cursor}"` : '';
+			const response = await graphql<SyncResponse>(`{
+      repository(name: "${repo.repo}", owner: "${repo.owner}") {
+        issues(first: 100 ${after} orderBy: {field: UPDATED_AT, direction: ASC}, filterBy: {since: "${window.since}"}) {
+          pageInfo {
+            endCursor
+            hasNextPage
+          }
+          nodes {
+            ${issueFields}
+          }
+        }
+      }
+      rateLimit {
+        cost
+        remaining
+        resetAt
+      }
+    }`);
+			return {
+				issues: response.repository.issues.nodes.map(toJSONOutputLine),
+				endCursor: response.repository.issues.pageInfo.endCursor,
+				hasNextPage: response.repository.issues.pageInfo.hasNextPage,
+				rateLimit: response.rateLimit,
+			};
+		},
+		async () => {
+			const response = await graphql<{ repository: { createdAt: string } }>(
+				`{ repository(name: "${repo.repo}", owner: "${repo.owner}") { createdAt } }`,
+			);
+			return response.repository.createdAt;
+		},
+		options,
+	);
+};
+
 const extractLabelEvents = (_issue: IssueResponse['nodes'][number]): LabelEvent[] => {
 	const issue = _issue;
 	const events: ({ timestamp: number } & (
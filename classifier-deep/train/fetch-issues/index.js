@@ -12,16 +12,35 @@ const utils_1 = require("../../../common/utils");
 const blobStorage_1 = require("../../blobStorage");
 const download_1 = require("./download");
 const endCursor = (0, utils_1.getInput)('cursor');
+const incremental = !!(0, utils_1.getInput)('incremental');
 const owner = (0, utils_1.getRequiredInput)('owner');
 const repo = (0, utils_1.getRequiredInput)('repo');
 const blobContainer = (0, utils_1.getRequiredInput)('blobContainerName');
+const blobStorageDir = (0, path_1.join)(__dirname, '..', '..', 'blobStorage');
+// An incremental sync starts from the dump and sync state uploaded by the previous run.
+const restorePreviousSync = async () => {
+    try {
+        await (0, blobStorage_1.downloadBlobFile)('issues.json.zip', blobContainer);
+        (0, child_process_1.execSync)(`unzip -o -q -j ${(0, path_1.join)(blobStorageDir, 'issues.json.zip')} -d ${__dirname}`);
+        (0, fs_1.unlinkSync)((0, path_1.join)(blobStorageDir, 'issues.json.zip'));
+        await (0, blobStorage_1.downloadBlobFile)('issues.state.json', blobContainer);
+        (0, fs_1.copyFileSync)((0, path_1.join)(blobStorageDir, 'issues.state.json'), (0, path_1.join)(__dirname, 'issues.state.json'));
+    }
+    catch {
+        (0, utils_1.safeLog)('could not restore previous sync, syncing from scratch');
+    }
+};
 class FetchIssues extends Action_1.Action {
     constructor() {
         super(...arguments);
         this.id = 'Classifier/Train/FetchIssues';
     }
     async onTriggered() {
-        if (endCursor) {
+        if (incremental) {
+            await restorePreviousSync();
+            await (0, download_1.sync)({ owner, repo });
+        }
+        else if (endCursor) {
             await (0, download_1.download)({ owner, repo }, endCursor);
         }
         else {
@@ -35,6 +54,10 @@ class FetchIssues extends Action_1.Action {
         await new Promise((resolve) => setTimeout(resolve, 1000));
         (0, child_process_1.execSync)(`zip -q ${(0, path_1.join)(__dirname, '..', '..', 'blobStorage', 'issues.json.zip')} ${(0, path_1.join)(__dirname, 'issues.json')}`);
         await (0, blobStorage_1.uploadBlobFile)('issues.json.zip', blobContainer);
+        if ((0, fs_1.existsSync)((0, path_1.join)(__dirname, 'issues.state.json'))) {
+            (0, fs_1.copyFileSync)((0, path_1.join)(__dirname, 'issues.state.json'), (0, path_1.join)(blobStorageDir, 'issues.state.json'));
+            await (0, blobStorage_1.uploadBlobFile)('issues.state.json', blobContainer);
+        }
     }
 }
 new FetchIssues().run(); // eslint-disable-line
@@ -4,23 +4,42 @@
  *--------------------------------------------------------------------------------------------*/
 
 import { execSync } from 'child_process';
-import { statSync } from 'fs';
+import { copyFileSync, existsSync, statSync, unlinkSync } from 'fs';
 import { join } from 'path';
 import { Action } from '../../../common/Action';
-import { getInput, getRequiredInput } from '../../../common/utils';
-import { uploadBlobFile } from '../../blobStorage';
-import { download } from './download';
+import { getInput, getRequiredInput, safeLog } from '../../../common/utils';
+import { downloadBlobFile, uploadBlobFile } from '../../blobStorage';
+import { download, sync } from './download';
 
 const endCursor = getInput('cursor');
+const incremental = !!getInput('incremental');
 const owner = getRequiredInput('owner');
 const repo = getRequiredInput('repo');
 const blobContainer = getRequiredInput('blobContainerName');
 
+const blobStorageDir = join(__dirname, '..', '..', 'blobStorage');
+
+// An incremental sync starts from the dump and sync state uploaded by the previous run.
+const restorePreviousSync = async () => {
+	try {
+		await downloadBlobFile('issues.json.zip', blobContainer);
+		execSync(`unzip -o -q -j ${join(blobStorageDir, 'issues.json.zip')} -d ${__dirname}`);
+		unlinkSync(join(blobStorageDir, 'issues.json.zip'));
+		await downloadBlobFile('issues.state.json', blobContainer);
+		copyFileSync(join(blobStorageDir, 'issues.state.json'), join(__dirname, 'issues.state.json'));
+	} catch {
+		safeLog('could not restore previous sync, syncing from scratch');
+	}
+};
+
 class FetchIssues extends Action {
 	id = 'Classifier/Train/FetchIssues';
 
 	async onTriggered() {
-		if (endCursor) {
+		if (incremental) {
+			await restorePreviousSync();
+			await sync({ owner, repo });
+		} else if (endCursor) {
 			await download({ owner, repo }, endCursor);
 		} else {
 			try {
@@ -38,6 +57,11 @@ class FetchIssues extends Action {
 		);
 
 		await uploadBlobFile('issues.json.zip', blobContainer);
+
+		if (existsSync(join(__dirname, 'issues.state.json'))) {
+			copyFileSync(join(__dirname, 'issues.state.json'), join(blobStorageDir, 'issues.state.json'));
+			await uploadBlobFile('issues.state.json', blobContainer);
+		}
 	}
 }
 
@@ -0,0 +1,194 @@
+# ---------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License. See LICENSE in the project root for license information.
+# ---------------------------------------------------------------------------------------------
+
+# Streams the train_data directories written by createDataDir.ts, one issue
+# file at a time, into a train and a test TSV file per category. With lazy
+# loading, simpletransformers reads a packed file through linecache, which
+# keeps the file's lines in memory but tokenizes each example only when it is
+# batched, so the tokenized corpus is never held.
+
+from dedup import MinHashIndex, deduplicate
+import numpy as np
+import os
+import zlib
+
+DATA_DIR = "train_data"
+PACKED_DIR = "packed_data"
+DEDUP_DIR = "dedup_index"
+# Outside <category>_model, which run.sh zips into the production model.
+CALIBRATION_DIR = "calibration_cache"
+
+# Train on one issue per cluster of near-duplicate issues and label. Off by
+# default, as it changes the training data of the models.
+DEDUPLICATE = False
+
+# Fraction of each category held out for evaluation and threshold calibration.
+TEST_SIZE = 0.33
+
+HEADER = "text\tlabels\n"
+
+# MinHash index of each category, shared by its main split and all folds.
+_dedup_indexes = {}
+
+
+def load_target_names(category):
+    # Same ordering as sklearn's load_files, so label indices are unchanged.
+    root = os.path.join(DATA_DIR, category)
+    return sorted(
+        name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name))
+    )
+
+
+def is_test(filename, fold=None, folds=None):
+    """Whether an issue is held out, either from the main split or from `fold`.
+
+    Hashes the file name rather than shuffling so the split is stable across
+    runs, scripts, and corpus growth.
+    """
+    h = zlib.crc32(filename.encode("utf-8"))
+    if fold is not None:
+        return h % folds == fold
+    return h % 100 < TEST_SIZE * 100
+
+
+def iter_files(category, fold=None, folds=None):
+    """Yield (path, label, split) for every issue file of a category."""
+    for label, target_name in enumerate(load_target_names(category)):
+        label_dir = os.path.join(DATA_DIR, category, target_name)
+        for filename in sorted(os.listdir(label_dir)):
+            split = "test" if is_test(filename, fold, folds) else "train"
+            yield os.path.join(label_dir, filename), label, split
+
+
+def read_issue(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def clean_text(text):
+    return " ".join(text.split())
+
+
+def fold_name(category, fold=None):
+    return category if fold is None else category + "_fold" + str(fold)
+
+
+def packed_path(category, split, fold=None):
+    return os.path.join(PACKED_DIR, fold_name(category, fold) + "_" + split + ".tsv")
+
+
+def dedup_index(category):
+    """Return the MinHash index of every issue of a category, hashing each once."""
+    if category not in _dedup_indexes:
+        index = MinHashIndex(os.path.join(DEDUP_DIR, category + ".npz"))
+        keys = [index.add(read_issue(path)) for path, _, _ in iter_files(category)]
+        index.save(keys)
+        print(
+            "{0}: hashed {1} new of {2} issues".format(
+                category, index.hashed, len(keys)
+            )
+        )
+        _dedup_indexes[category] = index
+    return _dedup_indexes[category]
+
+
+def near_duplicates(category, fold=None, folds=None):
+    """Return the paths of the train issues that duplicate another of the same label."""
+    train_files = [
+        (path, label)
+        for path, label, split in iter_files(category, fold, folds)
+        if split == "train"
+    ]
+    keep = deduplicate(
+        (read_issue(path) for path, _ in train_files),
+        [label for _, label in train_files],
+        name=fold_name(category, fold) + " train",
+        index=dedup_index(category),
+    )
+    return {path for (path, _), k in zip(train_files, keep) if not k}
+
+
+def pack_corpus(category, fold=None, folds=None):
+    """Write the train and test TSV files for a category.
+
+    With `fold` and `folds`, the test file holds that one of `folds` folds.
+    Returns (train_path, test_path, target_names).
+    """
+    os.makedirs(PACKED_DIR, exist_ok=True)
+    skipped = near_duplicates(category, fold, folds) if DEDUPLICATE else set()
+
+    paths = {split: packed_path(category, split, fold) for split in ("train", "test")}
+    files = {split: open(path, "w", encoding="utf-8") for split, path in paths.items()}
+    try:
+        for f in files.values():
+            f.write(HEADER)
+        for path, label, split in iter_files(category, fold, folds):
+            if path in skipped:
+                continue
+            files[split].write(clean_text(read_issue(path)) + "\t" + str(label) + "\n")
+    finally:
+        for f in files.values():
+            f.close()
+
+    return paths["train"], paths["test"], load_target_names(category)
+
+
+def load_packed(category):
+    """Like pack_corpus, but reuses the files already packed for this run."""
+    train_path = packed_path(category, "train")
+    test_path = packed_path(category, "test")
+    if os.path.exists(train_path) and os.path.exists(test_path):
+        return train_path, test_path, load_target_names(category)
+    return pack_corpus(category)
+
+
+def read_packed_labels(path):
+    labels = []
+    for _, batch_labels in iter_packed(path):
+        labels.extend(batch_labels)
+    return np.array(labels, dtype=int)
+
+
+def logits_path(category, fold=None):
+    name = "logits.npz" if fold is None else "logits-fold" + str(fold) + ".npz"
+    return os.path.join(CALIBRATION_DIR, category, name)
+
+
+def save_logits(path, logits, labels, folds=0):
+    """Cache the per-example model outputs of an evaluation pass, for calibration.
+
+    Out-of-fold logits record the number of `folds` they are one of.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez(path, logits=np.asarray(logits), labels=np.asarray(labels), folds=folds)
+
+
+def iter_packed(path, batch_size=1024):
+    """Yield (texts, labels) batches from a packed TSV file."""
+    texts = []
+    labels = []
+    with open(path, encoding="utf-8") as f:
+        next(f)
+        for line in f:
+            text, label = line.rstrip("\n").rsplit("\t", 1)
+            texts.append(text)
+            labels.append(int(label))
+            if len(texts) == batch_size:
+                yield texts, labels
+                texts = []
+                labels = []
+    if texts:
+        yield texts, labels
+
+
+def lazy_loading_args():
+    """ClassificationArgs fields that make simpletransformers read packed files lazily."""
+    return {
+        "lazy_loading": True,
+        "lazy_delimiter": "\t",
+        "lazy_text_column": 0,
+        "lazy_labels_column": 1,
+        "lazy_loading_start_line": 1,
+    }
@@ -0,0 +1,153 @@
+# ---------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License. See LICENSE in the project root for license information.
+# ---------------------------------------------------------------------------------------------
+
+# Near-duplicate removal for training corpora. Each document is reduced to a
+# MinHash signature over shingles of its stemmed words, and an LSH banding of
+# the signatures proposes candidate pairs. Candidates whose estimated Jaccard
+# similarity reaches SIMILARITY are clustered, and one document per cluster
+# and label is kept. Signatures are persisted, keyed by a digest of the text,
+# so later runs only hash documents they have not seen.
+#
+# Keep in sync with classifier/train/generate-models/dedup.py
+
+import numpy as np
+import hashlib
+import zlib
+import re
+import os
+
+from nltk.stem import SnowballStemmer
+
+stemmer = SnowballStemmer("english")
+
+NUM_PERM = 128
+BANDS = 16
+SHINGLE_SIZE = 3
+SIMILARITY = 0.8
+SEED = 42
+
+# A prime just above 2**32, for universal hashing of 32 bit shingle hashes.
+PRIME = 4294967311
+
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+_random = np.random.RandomState(SEED)
+_A = _random.randint(1, 2 ** 31, size=NUM_PERM).astype(np.uint64)
+_B = _random.randint(0, 2 ** 31, size=NUM_PERM).astype(np.uint64)
+
+
+def text_key(text):
+    return hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()
+
+
+def shingles(text):
+    words = [stemmer.stem(w) for w in TOKEN_PATTERN.findall(text.lower())]
+    grams = {
+        " ".join(words[i : i + SHINGLE_SIZE])
+        for i in range(max(1, len(words) - SHINGLE_SIZE + 1))
+    }
+    return np.array([zlib.crc32(g.encode("utf-8")) for g in grams], dtype=np.uint64)
+
+
+def signature(text):
+    hashes = shingles(text)
+    return ((np.outer(hashes, _A) + _B) % PRIME).min(axis=0).astype(np.uint32)
+
+
+class MinHashIndex:
+    """MinHash signatures of documents, keyed by text_key."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.signatures = {}
+        self.hashed = 0
+        if path and os.path.exists(path):
+            stored = np.load(path)
+            if stored["params"].tolist() == [NUM_PERM, SHINGLE_SIZE, SEED]:
+                self.signatures = dict(zip(stored["keys"], stored["signatures"]))
+
+    def add(self, text):
+        key = text_key(text)
+        if key not in self.signatures:
+            self.signatures[key] = signature(text)
+            self.hashed += 1
+        return key
+
+    def save(self, keys):
+        """Persist the signatures of `keys`, dropping documents no longer present."""
+        keys = sorted(set(keys))
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        np.savez(
+            self.path,
+            params=np.array([NUM_PERM, SHINGLE_SIZE, SEED]),
+            keys=np.array(keys, dtype=str),
+            signatures=np.array(
+                [self.signatures[key] for key in keys], dtype=np.uint32
+            ).reshape(len(keys), NUM_PERM),
+        )
+
+
+def find(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+
+def clusters(signatures):
+    """Label each row of a signature matrix with the id of its near-duplicate cluster."""
+    parents = list(range(len(signatures)))
+    rows = NUM_PERM // BANDS
+
+    for band in range(BANDS):
+        buckets = {}
+        for i, value in enumerate(signatures[:, band * rows : (band + 1) * rows]):
+            buckets.setdefault(value.tobytes(), []).append(i)
+        for members in buckets.values():
+            for j in members[1:]:
+                a, b = find(parents, members[0]), find(parents, j)
+                if a != b and (
+                    np.mean(signatures[members[0]] == signatures[j]) >= SIMILARITY
+                ):
+                    parents[b] = a
+
+    return np.array([find(parents, i) for i in range(len(signatures))], dtype=int)
+
+
+def deduplicate(texts, labels, index_path=None, name="corpus", index=None):
+    """Return a mask keeping one document per near-duplicate cluster and label.
+
+    `texts` may be any iterable and is consumed once. A MinHashIndex passed as
+    `index` is shared with the caller, who then persists it.
+    """
+    if index is None:
+        index = MinHashIndex(index_path)
+    hashed = index.hashed
+    keys = [index.add(text) for text in texts]
+    labels = np.asarray(labels, dtype=int)
+
+    if len(keys) == 0:
+        return np.zeros(0, dtype=bool)
+
+    cluster_ids = clusters(np.array([index.signatures[key] for key in keys]))
+    _, first = np.unique(
+        np.stack([cluster_ids, labels], axis=1), axis=0, return_index=True
+    )
+    keep = np.zeros(len(keys), dtype=bool)
+    keep[first] = True
+
+    if index_path:
+        index.save(keys)
+
+    print(
+        "{0}: kept {1} of {2} documents ({3:.1%} removed), hashed {4} new".format(
+            name,
+            int(keep.sum()),
+            len(keep),
+            1 - keep.sum() / len(keep),
+            index.hashed - hashed,
+        )
+    )
+    return keep
@@ -3,144 +3,208 @@
 #  Licensed under the MIT License. See LICENSE in the project root for license information.
 # ---------------------------------------------------------------------------------------------
 
+# Calibrates thresholds.json from the per-example logits cached by
+# generateModels.py. Out-of-fold logits are used when generateModels.py was
+# run with --folds and wrote the logits of every fold, otherwise the holdout
+# logits. The model is only run again when no logits are cached.
+
 from simpletransformers.classification import ClassificationModel
-from sklearn.datasets import load_files
-from sklearn.model_selection import train_test_split
+from dataset import (
+    iter_packed,
+    load_packed,
+    load_target_names,
+    logits_path,
+    save_logits,
+)
+from inputs import predict_bucketed, merge_stats, format_stats
+import multiprocessing as mp
+import numpy as np
+import glob
 import json
-import pandas as pd
 import logging
 import os
 
-DATA_DIR = "train_data"
-
+CATEGORIES = ["area", "assignee"]
 
-def load_dataframes(category):
-    files = load_files(
-        os.path.join(DATA_DIR, category),
-        encoding="utf-8",
-        decode_error="replace",
-        shuffle=True,
-        random_state=42,
-    )
+TARGET_PRECISIONS = [target_precision / 100 for target_precision in range(0, 101, 5)]
 
-    data = files.data
-    target = files.target
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        data, target, test_size=0.33, random_state=42
+def predict_packed(model, path, baseline=False):
+    # Predict in bounded batches so only the outputs, not the corpus, are held.
+    predictions = []
+    raw_outputs = []
+    labels = []
+    total_stats = None
+    for batch_texts, batch_labels in iter_packed(path):
+        batch_predictions, batch_raw_outputs, stats = predict_bucketed(
+            model, batch_texts, baseline=baseline
+        )
+        total_stats = merge_stats(total_stats, stats)
+        predictions.append(batch_predictions)
+        raw_outputs.append(batch_raw_outputs)
+        labels.append(batch_labels)
+    print(format_stats(total_stats))
+    return (
+        np.concatenate(predictions),
+        np.concatenate(raw_outputs),
+        np.concatenate(labels),
     )
 
-    train_df = pd.DataFrame(zip(X_train, y_train))
-    train_df.columns = ["text", "labels"]
-
-    test_df = pd.DataFrame(zip(X_test, y_test))
-    test_df.columns = ["text", "labels"]
-
-    return test_df, train_df, files.target_names
 
+def getThresholds(
+    predictions, raw_outputs, real_labels, data_target_names, model_target_names
+):
+    """Compute the score cutoffs reaching each target precision, for every label.
+
+    Guesses for a label are ranked by score, and each target precision gets
+    the lowest cutoff at which the guesses above it are still that precise.
+    """
+    predictions = np.asarray(predictions, dtype=int)
+    real_labels = np.asarray(real_labels, dtype=int)
+    raw_outputs = np.asarray(raw_outputs)
+
+    data_index = {name: i for i, name in enumerate(data_target_names)}
+    guessed_label = np.array(
+        [data_index.get(name, -1) for name in model_target_names], dtype=int
+    )[predictions]
+    scores = raw_outputs[np.arange(len(predictions)), predictions]
+    correct = predictions == real_labels
+
+    keep = guessed_label >= 0
+    guessed_label = guessed_label[keep]
+    scores = scores[keep]
+    correct = correct[keep]
+
+    # Best guesses first within each label, correct ones first among equal scores.
+    order = np.lexsort((~correct, -scores, guessed_label))
+    guessed_label = guessed_label[order]
+    scores = scores[order]
+    correct = correct[order]
+
+    labels, starts, counts = np.unique(
+        guessed_label, return_index=True, return_counts=True
+    )
+    position = np.arange(len(guessed_label)) - np.repeat(starts, counts)
+    num_guessed = position + 1
+    cumulative_correct = np.cumsum(correct)
+    num_correct = cumulative_correct - np.repeat(
+        cumulative_correct[starts] - correct[starts], counts
+    )
+    precision = num_correct / num_guessed
 
-logging.basicConfig(level=logging.INFO)
-transformers_logger = logging.getLogger("transformers")
-transformers_logger.setLevel(logging.WARNING)
-
-categories = ["area", "assignee"]
+    num_totals = np.bincount(real_labels, minlength=len(data_target_names))
 
+    # For each target precision, the last guess of each label still reaching it.
+    reaches = precision[np.newaxis, :] >= np.array(TARGET_PRECISIONS)[:, np.newaxis]
+    candidates = np.where(reaches, np.arange(len(precision)), -1)
+    last = (
+        np.maximum.reduceat(candidates, starts, axis=1)
+        if len(starts)
+        else np.zeros((len(TARGET_PRECISIONS), 0), dtype=int)
+    )
 
-def getThresholds(
-    label, predictions, raw_outputs, real_labels, data_target_names, model_target_names
-):
-    cutoffs = {}
-
-    guesses = []
-    for prediction, raw_output, real_label in zip(
-        predictions, raw_outputs, real_labels
-    ):
-        if model_target_names[prediction] == label:
-            guesses.append((raw_output[prediction], prediction == real_label,))
-    guesses.sort(reverse=True)
-
-    num_total = int(
-        len(
-            [
-                real_label
-                for real_label in real_labels
-                if data_target_names[real_label] == label
-            ]
+    thresholds = {name: {} for name in data_target_names}
+    for column, label in enumerate(labels):
+        name = data_target_names[label]
+        num_total = int(num_totals[label])
+        for row, target_precision in enumerate(TARGET_PRECISIONS):
+            i = last[row, column]
+            if i < 0:
+                continue
+            thresholds[name][target_precision] = {
+                "cutoff": float(scores[i]),
+                "num_correct": int(num_correct[i]),
+                "num_guessed": int(num_guessed[i]),
+                "num_total": num_total,
+                "precision": float(precision[i]),
+                "recall": int(num_correct[i]) / num_total if num_total != 0 else "NaN",
+            }
+
+    return thresholds
+
+
+def load_fold_logits(category):
+    """Return the cached out-of-fold logits if every fold of one run is present."""
+    paths = sorted(glob.glob(logits_path(category, "*")))
+    if not paths:
+        return None
+
+    cached = [np.load(path) for path in paths]
+    folds = {int(c["folds"]) if "folds" in c else 0 for c in cached}
+    expected = {logits_path(category, fold) for fold in range(len(paths))}
+    if folds != {len(paths)} or set(paths) != expected:
+        print(
+            category + ": ignoring out-of-fold logits of an incomplete run,",
+            ", ".join(paths),
         )
+        return None
+    return paths, cached
+
+
+def load_logits(category):
+    """Return cached (raw_outputs, labels), preferring out-of-fold logits."""
+    fold_logits = load_fold_logits(category)
+    if fold_logits is not None:
+        paths, cached = fold_logits
+    else:
+        paths = [logits_path(category)]
+        if not os.path.exists(paths[0]):
+            return None
+        cached = [np.load(paths[0])]
+
+    print(category + ": calibrating on", ", ".join(paths))
+    return (
+        np.concatenate([c["logits"] for c in cached]),
+        np.concatenate([c["labels"] for c in cached]),
     )
 
-    for target_precision in range(0, 101, 5):
-        target_precision /= 100
 
-        num_guessed = 0
-        num_correct = 0
+def calibrate_category(category, use_cuda=True, baseline=False):
+    data_target_names = load_target_names(category)
 
-        for score, correct in guesses:
-            if correct:
-                num_correct += 1
-            num_guessed += 1
+    with open(os.path.join(category + "_model", "target_names.json")) as fp:
+        model_target_names = json.load(fp)
 
-            if num_correct / num_guessed >= target_precision:
-                cutoffs[target_precision] = {
-                    "cutoff": float(score),
-                    "num_correct": num_correct,
-                    "num_guessed": num_guessed,
-                    "num_total": num_total,
-                    "precision": num_correct / num_guessed
-                    if num_guessed != 0
-                    else "NaN",
-                    "recall": num_correct / num_total if num_total != 0 else "NaN",
-                }
+    cached = load_logits(category)
+    if cached is None:
+        _, test_path, _ = load_packed(category)
 
-    return cutoffs
+        # Create a ClassificationModel
+        model = ClassificationModel(
+            "bert",
+            category + "_model",
+            num_labels=len(model_target_names),
+            use_cuda=use_cuda,
+        )
 
+        # Make predictions with the model
+        _, raw_outputs, test_labels = predict_packed(model, test_path, baseline)
+        save_logits(logits_path(category), raw_outputs, test_labels)
+    else:
+        raw_outputs, test_labels = cached
+
+    return getThresholds(
+        np.argmax(raw_outputs, axis=1),
+        raw_outputs,
+        test_labels,
+        data_target_names,
+        model_target_names,
+    )
 
-for category in categories:
-    test_df, train_df, data_target_names = load_dataframes(category)
-    thresholds = {}
 
-    with open(os.path.join(category + "_model", "target_names.json")) as fp:
-        model_target_names = json.load(fp)
+def main():
+    logging.basicConfig(level=logging.INFO)
+    transformers_logger = logging.getLogger("transformers")
+    transformers_logger.setLevel(logging.WARNING)
 
-    # Create a ClassificationModel
-    model = ClassificationModel(
-        "bert", category + "_model", num_labels=len(model_target_names)
-    )
+    # Spawn, as workers that need to run the model may initialize CUDA.
+    with mp.get_context("spawn").Pool(len(CATEGORIES)) as pool:
+        results = pool.map(calibrate_category, CATEGORIES)
+
+    for category, thresholds in zip(CATEGORIES, results):
+        with open(os.path.join(category + "_model", "thresholds.json"), "w") as fp:
+            json.dump(thresholds, fp)
 
-    # Make predictions with the model
-    predictions, raw_outputs = model.predict(test_df["text"])
-
-    for data_target_name in data_target_names:
-        thresholds[data_target_name] = getThresholds(
-            data_target_name,
-            predictions,
-            raw_outputs,
-            test_df["labels"],
-            data_target_names,
-            model_target_names,
-        )
 
-    for target_precision in range(0, 101, 5):
-        target_precision /= 100
-
-        total_items = 0
-        total_correct = 0
-
-        for data_target_name in data_target_names:
-            total_items += int(
-                len(
-                    [
-                        label
-                        for label in test_df["labels"]
-                        if data_target_names[label] == data_target_name
-                    ]
-                )
-            )
-            if target_precision in thresholds[data_target_name]:
-                # total_items += thresholds[data_target_name][target_precision]['num_total']
-                total_correct += thresholds[data_target_name][target_precision][
-                    "num_correct"
-                ]
-
-    with open(os.path.join(category + "_model", "thresholds.json"), "w") as fp:
-        json.dump(thresholds, fp)
+if __name__ == "__main__":
+    main()
@@ -3,84 +3,369 @@
 #  Licensed under the MIT License. See LICENSE in the project root for license information.
 # ---------------------------------------------------------------------------------------------
 
+# Training checkpoints under <category>_model/checkpoints are kept until run.sh
+# destroys them after a successful run. If training is interrupted, running
+# this script again resumes each category from its latest checkpoint, as long
+# as the training corpus has not changed. Each run restarts simpletransformers'
+# own best model tracking, so its best model is only promoted to
+# <category>_model_best when it beats the f1 of the best one of earlier runs.
+
 from simpletransformers.classification import ClassificationModel, ClassificationArgs
-from sklearn.datasets import load_files
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import f1_score, accuracy_score
-import pandas as pd
+from dataset import (
+    fold_name,
+    lazy_loading_args,
+    logits_path,
+    pack_corpus,
+    read_packed_labels,
+    save_logits,
+)
+import multiprocessing as mp
+import argparse
+import glob
+import hashlib
 import logging
+import shutil
 import json
+import time
+import re
 import os
 
-DATA_DIR = "train_data"
+CATEGORIES = ["area", "assignee"]
 
+# Steps between checkpoints, each of which is also an early stopping evaluation.
+CHECKPOINT_STEPS = 2000
 
-def load_dataframes(category):
-    files = load_files(
-        os.path.join(DATA_DIR, category),
-        encoding="utf-8",
-        decode_error="replace",
-        shuffle=True,
-        random_state=42,
-    )
+# Evaluations without an f1 improvement before training stops.
+EARLY_STOPPING_PATIENCE = 3
 
-    data = files.data
-    target = files.target
+# Complete checkpoints kept on disk. Each holds the weights and the optimizer
+# and scheduler state, so old ones are pruned while training runs.
+KEEP_CHECKPOINTS = 2
+
+# Seconds between checks for checkpoints to prune.
+PRUNE_INTERVAL = 60
+
+# Wall clock seconds each category may train for, shared by its model and its
+# fold models. When a model's share runs out, its best checkpoint so far
+# becomes the model.
+TIME_BUDGET = {
+    "area": 8 * 60 * 60,
+    "assignee": 8 * 60 * 60,
+}
+
+# With more than one fold, a model is also trained for each fold of the corpus
+# so generateConfigurations.py can calibrate on out-of-fold logits.
+FOLDS = 0
+
+CHECKPOINT_PATTERN = re.compile(r"^checkpoint-(\d+)")
+
+TRAINING_STATE_FILES = {"optimizer.pt", "scheduler.pt"}
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        data, target, test_size=0.33, random_state=42
-    )
 
-    train_df = pd.DataFrame(zip(X_train, y_train))
-    train_df.columns = ["text", "labels"]
+def model_dir(category):
+    return category + "_model"
 
-    test_df = pd.DataFrame(zip(X_test, y_test))
-    test_df.columns = ["text", "labels"]
 
-    return test_df, train_df, files.target_names
+def checkpoint_dir(category):
+    return os.path.join(model_dir(category), "checkpoints")
 
 
-logging.basicConfig(level=logging.INFO)
-transformers_logger = logging.getLogger("transformers")
-transformers_logger.setLevel(logging.WARNING)
+def best_model_dir(category):
+    return model_dir(category) + "_best"
 
-categories = ["area", "assignee"]
 
-for category in categories:
-    test_df, train_df, target_names = load_dataframes(category)
+def attempt_best_dir(category):
+    # Where simpletransformers saves the best model of a single run.
+    return model_dir(category) + "_best_attempt"
 
-    model_args = ClassificationArgs(
-        output_dir=category + "_model",
-        best_model_dir=category + "_model_best",
+
+def f1_multiclass(labels, preds):
+    return f1_score(labels, preds, average="micro")
+
+
+def model_args(category, patience=EARLY_STOPPING_PATIENCE):
+    return ClassificationArgs(
+        output_dir=model_dir(category),
+        best_model_dir=attempt_best_dir(category),
         overwrite_output_dir=True,
         train_batch_size=16,
         eval_batch_size=32,
         max_seq_length=256,
         num_train_epochs=2,
-        save_model_every_epoch=False,
+        save_steps=CHECKPOINT_STEPS,
+        save_model_every_epoch=True,
         save_eval_checkpoints=False,
+        evaluate_during_training=True,
+        evaluate_during_training_steps=CHECKPOINT_STEPS,
+        use_early_stopping=True,
+        early_stopping_metric="f1",
+        early_stopping_metric_minimize=False,
+        early_stopping_patience=patience,
+        **lazy_loading_args(),
     )
 
-    def f1_multiclass(labels, preds):
-        return f1_score(labels, preds, average="micro")
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def list_checkpoints(category):
+    """Return (step, path, complete) of each checkpoint, oldest first."""
+    if not os.path.isdir(checkpoint_dir(category)):
+        return []
+
+    checkpoints = []
+    for name in os.listdir(checkpoint_dir(category)):
+        match = CHECKPOINT_PATTERN.match(name)
+        path = os.path.join(checkpoint_dir(category), name)
+        # model_args.json is written last, so its presence marks a complete save.
+        if match:
+            complete = os.path.exists(os.path.join(path, "model_args.json"))
+            checkpoints.append((int(match.group(1)), path, complete))
+    return sorted(checkpoints)
+
+
+def latest_checkpoint(category):
+    """Return the most recent complete checkpoint, or None."""
+    complete = [path for _, path, done in list_checkpoints(category) if done]
+    return complete[-1] if complete else None
+
+
+def prune_checkpoints(category, training=False):
+    """Keep only the KEEP_CHECKPOINTS latest complete checkpoints.
+
+    Unless training, incomplete checkpoints are removed too, as nothing will
+    finish writing them.
+    """
+    checkpoints = list_checkpoints(category)
+    complete = [path for _, path, done in checkpoints if done]
+    for _, path, done in checkpoints:
+        if done and path not in complete[-KEEP_CHECKPOINTS:]:
+            shutil.rmtree(path, ignore_errors=True)
+        elif not done and not training:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def best_f1(path):
+    """Return the f1 saved with the model in path, or None."""
+    results_path = os.path.join(path, "eval_results.txt")
+    if not os.path.exists(os.path.join(path, "model_args.json")):
+        return None
+    if not os.path.exists(results_path):
+        return None
+    with open(results_path) as f:
+        for line in f:
+            key, _, value = line.partition(" = ")
+            if key == "f1":
+                return float(value)
+    return None
+
+
+def promote_best(category):
+    # Only a run's best model that beats the earlier runs' one replaces it.
+    attempt_f1 = best_f1(attempt_best_dir(category))
+    if attempt_f1 is not None:
+        previous_f1 = best_f1(best_model_dir(category))
+        if previous_f1 is None or attempt_f1 > previous_f1:
+            print("New best", category, "model with f1", attempt_f1)
+            shutil.rmtree(best_model_dir(category), ignore_errors=True)
+            shutil.move(attempt_best_dir(category), best_model_dir(category))
+    shutil.rmtree(attempt_best_dir(category), ignore_errors=True)
+
+
+def prepare_checkpoints(category, train_path):
+    # Checkpoints are only resumable on the corpus they were trained on.
+    digest_path = os.path.join(checkpoint_dir(category), "corpus.sha1")
+    digest = file_digest(train_path)
+
+    if os.path.exists(digest_path):
+        with open(digest_path) as f:
+            if f.read() != digest:
+                print("Corpus changed, discarding", category, "checkpoints")
+                shutil.rmtree(checkpoint_dir(category))
+
+    # A run stopped before finalize_category still leaves its best model.
+    promote_best(category)
+    prune_checkpoints(category)
+
+    # A best model is only meaningful for the checkpoints it was saved with.
+    if latest_checkpoint(category) is None:
+        shutil.rmtree(best_model_dir(category), ignore_errors=True)
+
+    os.makedirs(checkpoint_dir(category), exist_ok=True)
+    with open(digest_path, "w") as f:
+        f.write(digest)
+
+
+def train_category(category, train_path, test_path, num_labels, patience):
+    checkpoint = latest_checkpoint(category)
+    if checkpoint:
+        print("Resuming", category, "from", checkpoint)
 
     # Create a ClassificationModel
     model = ClassificationModel(
-        "bert", "finetuned", num_labels=len(target_names), args=model_args,
+        "bert",
+        checkpoint or "finetuned",
+        num_labels=num_labels,
+        args=model_args(category, patience),
     )
 
     # Train the model
     model.train_model(
-        train_df, eval_df=test_df, output_dir=category + "_model/checkpoints"
+        train_path,
+        eval_df=test_path,
+        output_dir=checkpoint_dir(category),
+        f1=f1_multiclass,
+        acc=accuracy_score,
     )
 
-    # Evaluate the model
+
+def finalize_category(category, completed):
+    # Early stopping leaves the last, not the best, model in the output dir.
+    promote_best(category)
+    source = best_model_dir(category)
+    if not os.path.exists(os.path.join(source, "model_args.json")):
+        source = None if completed else latest_checkpoint(category)
+    if source:
+        print("Using", source, "as the", category, "model")
+        for name in os.listdir(source):
+            path = os.path.join(source, name)
+            # Optimizer state is only needed to resume training.
+            if os.path.isfile(path) and name not in TRAINING_STATE_FILES:
+                shutil.copy(path, model_dir(category))
+
+
+def train_with_budget(
+    context, name, train_path, test_path, num_labels, budget, patience
+):
+    prepare_checkpoints(name, train_path)
+
+    # The spawned process re-imports this module, so settings from the command
+    # line are passed along rather than read from globals.
+    process = context.Process(
+        target=train_category,
+        args=(name, train_path, test_path, num_labels, patience),
+    )
+    process.start()
+
+    deadline = time.monotonic() + budget
+    while process.is_alive() and time.monotonic() < deadline:
+        process.join(min(PRUNE_INTERVAL, max(deadline - time.monotonic(), 0)))
+        prune_checkpoints(name, training=process.is_alive())
+
+    completed = not process.is_alive()
+    if not completed:
+        print("Time budget reached, stopping", name, "training")
+        process.terminate()
+        process.join()
+    elif process.exitcode != 0:
+        raise SystemExit(name + " training failed")
+
+    finalize_category(name, completed)
+    if not os.path.exists(os.path.join(model_dir(name), "model_args.json")):
+        raise SystemExit("No " + name + " model was saved")
+
+
+def evaluate_category(name, test_path, num_labels):
+    model = ClassificationModel(
+        "bert", model_dir(name), num_labels=num_labels, args=model_args(name),
+    )
     result, model_outputs, wrong_predictions = model.eval_model(
-        test_df,
-        output_dir=category + "_model/eval",
+        test_path,
+        output_dir=os.path.join(model_dir(name), "eval"),
         f1=f1_multiclass,
         acc=accuracy_score,
     )
+    return model_outputs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--folds", type=int, default=FOLDS)
+    parser.add_argument(
+        "--patience",
+        type=int,
+        default=EARLY_STOPPING_PATIENCE,
+        help="evaluations without an f1 improvement before training stops",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        help="seconds each category may train for, instead of TIME_BUDGET",
+    )
+    args = parser.parse_args()
+    folds = args.folds if args.folds > 1 else 0
+
+    logging.basicConfig(level=logging.INFO)
+    transformers_logger = logging.getLogger("transformers")
+    transformers_logger.setLevel(logging.WARNING)
+
+    # Each category trains in its own process so it can be stopped at its time
+    # budget. Spawn, because the parent may already have initialized CUDA.
+    context = mp.get_context("spawn")
+
+    for category in CATEGORIES:
+        budget = args.time_budget or TIME_BUDGET[category]
+        deadline = time.monotonic() + budget
+
+        def next_budget(runs_left):
+            # Time a model leaves unused by stopping early goes to the next.
+            return max(deadline - time.monotonic(), 0) / runs_left
+
+        train_path, test_path, target_names = pack_corpus(category)
+        train_with_budget(
+            context,
+            category,
+            train_path,
+            test_path,
+            len(target_names),
+            next_budget(folds + 1),
+            args.patience,
+        )
+
+        # Evaluate the model, keeping its outputs for threshold calibration.
+        model_outputs = evaluate_category(category, test_path, len(target_names))
+        save_logits(
+            logits_path(category), model_outputs, read_packed_labels(test_path)
+        )
+
+        with open(os.path.join(model_dir(category), "target_names.json"), "w") as f:
+            json.dump(target_names, f)
+
+        # Out-of-fold logits from an earlier run do not describe this model.
+        for path in glob.glob(logits_path(category, "*")):
+            os.remove(path)
+
+        for fold in range(folds):
+            name = fold_name(category, fold)
+            train_path, test_path, _ = pack_corpus(category, fold, folds)
+            train_with_budget(
+                context,
+                name,
+                train_path,
+                test_path,
+                len(target_names),
+                next_budget(folds - fold),
+                args.patience,
+            )
+            model_outputs = evaluate_category(name, test_path, len(target_names))
+            save_logits(
+                logits_path(category, fold),
+                model_outputs,
+                read_packed_labels(test_path),
+                folds,
+            )
+
+            # Only the logits of fold models are kept.
+            shutil.rmtree(model_dir(name))
+            shutil.rmtree(best_model_dir(name), ignore_errors=True)
+            shutil.rmtree(attempt_best_dir(name), ignore_errors=True)
+
 
-    with open(os.path.join(category + "_model", "target_names.json"), "w") as f:
-        json.dump(target_names, f)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# ---------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License. See LICENSE in the project root for license information.
+# ---------------------------------------------------------------------------------------------
+
+# Also imported by apply/generate-labels/main.py, from this directory.
+
+import time
+import numpy as np
+import torch
+
+# Character budget for an issue before it reaches the tokenizer. Issues that
+# paste long logs would otherwise be tokenized in full only to be cut at
+# max_seq_length. 8 characters per token comfortably covers a 256 token window.
+MAX_CHARS = 2048
+
+# Characters of the budget taken from the end of the issue. The models are
+# trained on the head of each issue, so this defaults to head-only truncation.
+TAIL_CHARS = 0
+
+# Batches are padded to a multiple of this many tokens.
+SEQ_LEN_STEP = 32
+
+
+def truncate(text, max_chars=MAX_CHARS, tail_chars=TAIL_CHARS):
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    head_chars = max_chars - tail_chars
+    if tail_chars <= 0:
+        return text[:head_chars]
+    return text[:head_chars] + " " + text[-tail_chars:]
+
+
+def predict_bucketed(
+    model, texts, max_chars=MAX_CHARS, tail_chars=TAIL_CHARS, baseline=False
+):
+    """Predict with a simpletransformers model, batching inputs of similar length.
+
+    Texts are pre-truncated to `max_chars` and tokenized once. The encodings
+    are sorted by length and run through the underlying transformers model
+    one eval batch at a time, each padded only to its longest input, so short
+    issues carry little padding. With `baseline`, the same texts are also run
+    through `model.predict`, which pads every input to max_seq_length, and
+    its time is reported alongside. Returns (predictions, raw_outputs, stats)
+    in the original order.
+    """
+    start = time.perf_counter()
+    max_seq_length = model.args.max_seq_length
+    batch_size = model.args.eval_batch_size
+    tokenizer = model.tokenizer
+
+    truncated = [truncate(text, max_chars, tail_chars) for text in texts]
+    # Tokenizers reject an empty batch.
+    encoded = (
+        tokenizer(truncated, truncation=True, max_length=max_seq_length)
+        if truncated
+        else {"input_ids": []}
+    )
+    lengths = np.array([len(ids) for ids in encoded["input_ids"]], dtype=int)
+    order = np.argsort(lengths, kind="stable")
+
+    raw_outputs = np.zeros((len(texts), model.num_labels), dtype=float)
+    padded_tokens = 0
+    model._move_model_to_device()
+    model.model.eval()
+    with torch.no_grad():
+        for i in range(0, len(order), batch_size):
+            batch = order[i : i + batch_size]
+            inputs = tokenizer.pad(
+                {key: [values[j] for j in batch] for key, values in encoded.items()},
+                pad_to_multiple_of=SEQ_LEN_STEP,
+                return_tensors="pt",
+            )
+            padded_tokens += inputs["input_ids"].numel()
+            inputs = {key: value.to(model.device) for key, value in inputs.items()}
+            raw_outputs[batch] = model.model(**inputs)[0].float().cpu().numpy()
+
+    stats = {
+        "inputs": len(texts),
+        "chars": sum(len(text) for text in texts),
+        "truncated_chars": sum(len(text) for text in truncated),
+        "tokens": int(lengths.sum()),
+        "padded_tokens": padded_tokens,
+        "unbucketed_padded_tokens": max_seq_length * len(texts),
+        "seconds": time.perf_counter() - start,
+    }
+    if baseline and len(texts):
+        start = time.perf_counter()
+        model.predict(list(texts))
+        stats["baseline_seconds"] = time.perf_counter() - start
+
+    return np.argmax(raw_outputs, axis=1), raw_outputs, stats
+
+
+def merge_stats(total, stats):
+    if total is None:
+        return dict(stats)
+    return {key: total.get(key, 0) + stats.get(key, 0) for key in {**total, **stats}}
+
+
+def format_stats(stats):
+    saved = stats["unbucketed_padded_tokens"] - stats["padded_tokens"]
+    message = (
+        f"{stats['inputs']} inputs in {stats['seconds']:.1f}s: "
+        f"pre-truncated {stats['chars']} to {stats['truncated_chars']} chars, "
+        f"{stats['tokens']} tokens padded to {stats['padded_tokens']} "
+        f"(saved {saved} of {stats['unbucketed_padded_tokens']} padded tokens)"
+    )
+    if "baseline_seconds" in stats:
+        message += (
+            f", {stats['baseline_seconds']:.1f}s unbucketed "
+            f"(saved {stats['baseline_seconds'] - stats['seconds']:.1f}s)"
+        )
+    return message
@@ -5,6 +5,7 @@ set -e
 echo 'Cleaning up prior data'
 rm -f blobs/*.zip
 rm -f issues.json
+rm -rf packed_data
 
 echo 'Getting latest issues dump'
 npx ts-node storage.ts download issues.json.zip vscode-issue-classifier
@@ -19,6 +20,10 @@ python generateModels.py
 echo 'Destroying checkpoints'
 rm -rf area_model/checkpoint*
 rm -rf assignee_model/checkpoint*
+rm -rf area_model_best
+rm -rf assignee_model_best
+rm -rf area_model_best_attempt
+rm -rf assignee_model_best_attempt
 
 echo 'Generating threshold configurations'
 python generateConfigurations.py
@@ -45,6 +45,7 @@ cd ..
 # Install simpletransformers (https://simpletransformers.ai/) library wrapping HuggingFace's Transformners (https://huggingface.co/transformers/)
 echo "Installing simpletransformers"
 pip install simpletransformers
+pip install nltk
 
 echo "Installing Node"
 sudo apt -y install curl dirmngr apt-transport-https lsb-release ca-certificates
@@ -0,0 +1,163 @@
+"use strict";
+/*---------------------------------------------------------------------------------------------
+ *  Copyright (c) Microsoft Corporation. All rights reserved.
+ *  Licensed under the MIT License. See LICENSE in the project root for license information.
+ *--------------------------------------------------------------------------------------------*/
+Object.defineProperty(exports, "__esModule", { value: true });
+exports.LabelApplier = exports.APPLY_CONCURRENCY = void 0;
+const utils_1 = require("../../../common/utils");
+/** Issues labelled at once. */
+exports.APPLY_CONCURRENCY = 8;
+/** Retries of a request that hit a secondary rate limit. */
+const MAX_RETRIES = 5;
+/** Backoff before the first retry, doubling with each further one, unless GitHub sends retry-after. */
+const RETRY_DELAY = 2000;
+const isSecondaryRateLimit = (err) => {
+    var _a, _b, _c;
+    return ((err === null || err === void 0 ? void 0 : err.status) === 403 || (err === null || err === void 0 ? void 0 : err.status) === 429) &&
+        (!!((_b = (_a = err.response) === null || _a === void 0 ? void 0 : _a.headers) === null || _b === void 0 ? void 0 : _b['retry-after']) || /secondary rate limit|abuse/i.test((_c = err.message) !== null && _c !== void 0 ? _c : ''));
+};
+class LabelApplier {
+    constructor(github, config, options = {}) {
+        this.github = github;
+        this.config = config;
+        this.options = options;
+        this.labelChecks = new Map();
+        this.labelCreations = new Map();
+    }
+    async run(labelings) {
+        var _a;
+        await (0, utils_1.mapWithConcurrency)(labelings, (_a = this.options.concurrency) !== null && _a !== void 0 ? _a : exports.APPLY_CONCURRENCY, (labeling) => this.applyLabeling(labeling));
+    }
+    async withRetry(request) {
+        var _a, _b, _c, _d;
+        for (let attempt = 0;; attempt++) {
+            try {
+                return await request();
+            }
+            catch (err) {
+                if (attempt >= MAX_RETRIES || !isSecondaryRateLimit(err)) {
+                    throw err;
+                }
+                const retryAfter = +((_c = (_b = (_a = err.response) === null || _a === void 0 ? void 0 : _a.headers) === null || _b === void 0 ? void 0 : _b['retry-after']) !== null && _c !== void 0 ? _c : 0);
+                const delay = retryAfter > 0
+                    ? retryAfter * 1000
+                    : ((_d = this.options.retryDelay) !== null && _d !== void 0 ? _d : RETRY_DELAY) * 2 ** attempt;
+                (0, utils_1.safeLog)('secondary rate limit hit, retrying in ms', delay);
+                await new Promise((resolve) => setTimeout(resolve, delay));
+            }
+        }
+    }
+    // Labels are looked up once per run, however many issues they are applied to.
+    hasLabel(name) {
+        let check = this.labelChecks.get(name);
+        if (!check) {
+            check = this.withRetry(() => this.github.repoHasLabel(name));
+            this.labelChecks.set(name, check);
+        }
+        return check;
+    }
+    ensureLabel(name, color) {
+        let creation = this.labelCreations.get(name);
+        if (!creation) {
+            creation = (async () => {
+                if (!(await this.hasLabel(name))) {
+                    (0, utils_1.safeLog)(`creating label ${name}`);
+                    await this.withRetry(() => this.github.createLabel(name, color, ''));
+                    this.labelChecks.set(name, Promise.resolve(true));
+                }
+            })();
+            this.labelCreations.set(name, creation);
+        }
+        return creation;
+    }
+    async planChanges(labeling) {
+        var _a, _b, _c;
+        const { config } = this;
+        const debug = !!this.options.debug;
+        const changes = { labels: new Set(), assignees: new Set(), comments: [] };
+        const assignee = labeling.assignee;
+        if (assignee) {
+            (0, utils_1.safeLog)('has assignee:', assignee);
+            if (debug) {
+                await this.ensureLabel(assignee, 'ffa5a1');
+                changes.labels.add(assignee);
+            }
+            const assigneeConfig = (_a = config.assignees) === null || _a === void 0 ? void 0 : _a[assignee];
+            if (assigneeConfig) {
+                (0, utils_1.safeLog)(JSON.stringify({ assigneeConfig }));
+                if (assigneeConfig.assign && !debug)
+                    changes.assignees.add(assignee);
+                if (assigneeConfig.comment)
+                    changes.comments.push(assigneeConfig.comment);
+            }
+            else if (!debug) {
+                changes.assignees.add(assignee);
+            }
+        }
+        else if (config.randomAssignment && config.labels) {
+            (0, utils_1.safeLog)('could not find assignee, picking a random one...');
+            const available = Object.keys(config.labels).reduce((acc, area) => {
+                var _a;
+                const areaConfig = (_a = config.labels) === null || _a === void 0 ? void 0 : _a[area];
+                if (areaConfig === null || areaConfig === void 0 ? void 0 : areaConfig.assign) {
+                    acc.push(...areaConfig.assign);
+                }
+                return acc;
+            }, []);
+            if (available.length) {
+                // Shuffle the array
+                for (let i = available.length - 1; i > 0; i--) {
+                    const j = Math.floor(Math.random() * (i + 1));
+                    [available[i], available[j]] = [available[j], available[i]];
+                }
+                if (!debug) {
+                    const randomSelection = available[0];
+                    (0, utils_1.safeLog)('assigning', randomSelection);
+                    changes.labels.add('triage-needed');
+                    changes.assignees.add(randomSelection);
+                }
+            }
+            else {
+                (0, utils_1.safeLog)('error assigning random: no assigness found');
+            }
+        }
+        const label = labeling.area;
+        if (label) {
+            (0, utils_1.safeLog)(`adding label ${label} to issue ${labeling.number}`);
+            if (debug) {
+                await this.ensureLabel(label, 'f1d9ff');
+            }
+            const labelConfig = (_b = config.labels) === null || _b === void 0 ? void 0 : _b[label];
+            if ((labelConfig === null || labelConfig === void 0 ? void 0 : labelConfig.applyLabel) || debug)
+                changes.labels.add(label);
+            if (labelConfig === null || labelConfig === void 0 ? void 0 : labelConfig.comment)
+                changes.comments.push(labelConfig.comment);
+            for (const labelAssignee of (_c = labelConfig === null || labelConfig === void 0 ? void 0 : labelConfig.assign) !== null && _c !== void 0 ? _c : []) {
+                changes.assignees.add(labelAssignee);
+            }
+        }
+        return changes;
+    }
+    async applyLabeling(labeling) {
+        const issue = this.github.getIssueByNumber(labeling.number);
+        const issueData = await this.withRetry(() => issue.getIssue());
+        if (!this.options.debug && issueData.assignee) {
+            (0, utils_1.safeLog)('skipping, already assigned to: ', issueData.assignee);
+            return;
+        }
+        const changes = await this.planChanges(labeling);
+        for (const label of changes.labels) {
+            if (!(await this.hasLabel(label))) {
+                throw Error(`Action could not execute becuase label ${label} is not defined.`);
+            }
+        }
+        await Promise.all([
+            changes.labels.size && this.withRetry(() => issue.addLabels([...changes.labels])),
+            changes.assignees.size && this.withRetry(() => issue.addAssignees([...changes.assignees])),
+            ...changes.comments.map((body) => this.withRetry(() => issue.postComment(body))),
+        ]);
+    }
+}
+exports.LabelApplier = LabelApplier;
+//# sourceMappingURL=ApplyLabels.js.map
\ No newline at end of file
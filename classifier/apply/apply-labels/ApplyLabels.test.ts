@@ -0,0 +1,130 @@
+/*---------------------------------------------------------------------------------------------
+ *  Copyright (c) Microsoft Corporation. All rights reserved.
+ *  Licensed under the MIT License. See LICENSE in the project root for license information.
+ *--------------------------------------------------------------------------------------------*/
+
+import { expect } from 'chai';
+import * as nock from 'nock';
+import { OctoKit } from '../../../api/octokit';
+import { ClassifierConfig, LabelApplier } from './ApplyLabels';
+
+const api = () => nock('https://api.github.com');
+
+const issueResponse = (number: number, assignee?: string) => ({
+	number,
+	title: 'issue ' + number,
+	body: '',
+	state: 'open',
+	comments: 0,
+	labels: [],
+	user: { login: 'author', type: 'User' },
+	assignee: assignee ? { login: assignee } : null,
+	assignees: assignee ? [{ login: assignee }] : [],
+	milestone: null,
+	created_at: '2020-01-01T00:00:00Z',
+	updated_at: '2020-01-01T00:00:00Z',
+	closed_at: null,
+});
+
+const config: ClassifierConfig = {
+	labels: { editor: { applyLabel: true, comment: 'Thanks!', assign: ['alice'] } },
+	assignees: { bob: { assign: true } },
+};
+
+const apply = (labelings: { number: number; area: string; assignee: string }[]) =>
+	new LabelApplier(new OctoKit('token', { owner: 'o', repo: 'r' }), config, { retryDelay: 1 }).run(
+		labelings,
+	);
+
+describe('ApplyLabels', () => {
+	afterEach(() => {
+		nock.cleanAll();
+	});
+
+	it('Looks each label up once and merges the changes to each issue', async () => {
+		const scope = api().get('/repos/o/r/labels/editor').once().reply(200, { name: 'editor' });
+		for (const number of [1, 2]) {
+			scope
+				.get(`/repos/o/r/issues/${number}`)
+				.reply(200, issueResponse(number))
+				.post(`/repos/o/r/issues/${number}/labels`, { labels: ['editor'] })
+				.reply(200, [])
+				.post(`/repos/o/r/issues/${number}/assignees`, { assignees: ['alice'] })
+				.reply(201, {})
+				.post(`/repos/o/r/issues/${number}/comments`, { body: 'Thanks!' })
+				.reply(201, {});
+		}
+
+		await apply([
+			{ number: 1, area: 'editor', assignee: '' },
+			{ number: 2, area: 'editor', assignee: '' },
+		]);
+
+		expect(scope.pendingMocks()).to.deep.equal([]);
+	});
+
+	it('Assigns the predicted and area assignees in one request', async () => {
+		const scope = api()
+			.get('/repos/o/r/issues/1')
+			.reply(200, issueResponse(1))
+			.get('/repos/o/r/labels/editor')
+			.reply(200, { name: 'editor' })
+			.post('/repos/o/r/issues/1/labels', { labels: ['editor'] })
+			.reply(200, [])
+			.post('/repos/o/r/issues/1/assignees', { assignees: ['bob', 'alice'] })
+			.reply(201, {})
+			.post('/repos/o/r/issues/1/comments', { body: 'Thanks!' })
+			.reply(201, {});
+
+		await apply([{ number: 1, area: 'editor', assignee: 'bob' }]);
+
+		expect(scope.pendingMocks()).to.deep.equal([]);
+	});
+
+	it('Skips issues which are already assigned', async () => {
+		const scope = api().get('/repos/o/r/issues/1').reply(200, issueResponse(1, 'carol'));
+
+		await apply([{ number: 1, area: 'editor', assignee: 'bob' }]);
+
+		expect(scope.pendingMocks()).to.deep.equal([]);
+	});
+
+	it('Creates and applies nothing in readonly mode', async () => {
+		const scope = api()
+			.get('/repos/o/r/issues/1')
+			.reply(200, issueResponse(1))
+			.get('/repos/o/r/labels/bob')
+			.reply(404, { message: 'Not Found' })
+			.get('/repos/o/r/labels/editor')
+			.reply(404, { message: 'Not Found' });
+		const writes = api().post(/.*/).reply(201, {});
+
+		const github = new OctoKit('token', { owner: 'o', repo: 'r' }, { readonly: true });
+		await new LabelApplier(github, config, { debug: true, retryDelay: 1 }).run([
+			{ number: 1, area: 'editor', assignee: 'bob' },
+		]);
+
+		expect(scope.pendingMocks()).to.deep.equal([]);
+		expect(writes.isDone()).to.equal(false);
+	});
+
+	it('Retries requests which hit a secondary rate limit', async () => {
+		const scope = api()
+			.get('/repos/o/r/issues/1')
+			.reply(200, issueResponse(1))
+			.get('/repos/o/r/labels/editor')
+			.reply(200, { name: 'editor' })
+			.post('/repos/o/r/issues/1/labels')
+			.reply(403, { message: 'You have exceeded a secondary rate limit.' })
+			.post('/repos/o/r/issues/1/labels', { labels: ['editor'] })
+			.reply(200, [])
+			.post('/repos/o/r/issues/1/assignees')
+			.reply(201, {})
+			.post('/repos/o/r/issues/1/comments')
+			.reply(201, {});
+
+		await apply([{ number: 1, area: 'editor', assignee: '' }]);
+
+		expect(scope.pendingMocks()).to.deep.equal([]);
+	});
+});
@@ -0,0 +1,186 @@
+/*---------------------------------------------------------------------------------------------
+ *  Copyright (c) Microsoft Corporation. All rights reserved.
+ *  Licensed under the MIT License. See LICENSE in the project root for license information.
+ *--------------------------------------------------------------------------------------------*/
+
+import { OctoKit } from '../../../api/octokit';
+import { mapWithConcurrency, safeLog } from '../../../common/utils';
+
+/** Issues labelled at once. */
+export const APPLY_CONCURRENCY = 8;
+
+/** Retries of a request that hit a secondary rate limit. */
+const MAX_RETRIES = 5;
+
+/** Backoff before the first retry, doubling with each further one, unless GitHub sends retry-after. */
+const RETRY_DELAY = 2000;
+
+export type ClassifierConfig = {
+	labels?: {
+		[area: string]: { applyLabel?: boolean; comment?: string; assign?: [string] };
+	};
+	randomAssignment?: boolean;
+	assignees?: {
+		[assignee: string]: { assign: boolean; comment?: string };
+	};
+};
+
+export type Labeling = { number: number; area: string; assignee: string };
+
+/** What to do to one issue, so each kind of change takes a single request. */
+type IssueChanges = { labels: Set<string>; assignees: Set<string>; comments: string[] };
+
+const isSecondaryRateLimit = (err: any) =>
+	(err?.status === 403 || err?.status === 429) &&
+	(!!err.response?.headers?.['retry-after'] || /secondary rate limit|abuse/i.test(err.message ?? ''));
+
+export class LabelApplier {
+	private labelChecks = new Map<string, Promise<boolean>>();
+	private labelCreations = new Map<string, Promise<void>>();
+
+	constructor(
+		private github: OctoKit,
+		private config: ClassifierConfig,
+		private options: { debug?: boolean; concurrency?: number; retryDelay?: number } = {},
+	) {}
+
+	async run(labelings: Labeling[]): Promise<void> {
+		await mapWithConcurrency(labelings, this.options.concurrency ?? APPLY_CONCURRENCY, (labeling) =>
+			this.applyLabeling(labeling),
+		);
+	}
+
+	private async withRetry<T>(request: () => Promise<T>): Promise<T> {
+		for (let attempt = 0; ; attempt++) {
+			try {
+				return await request();
+			} catch (err) {
+				if (attempt >= MAX_RETRIES || !isSecondaryRateLimit(err)) {
+					throw err;
+				}
+				const retryAfter = +((err as any).response?.headers?.['retry-after'] ?? 0);
+				const delay =
+					retryAfter > 0
+						? retryAfter * 1000
+						: (this.options.retryDelay ?? RETRY_DELAY) * 2 ** attempt;
+				safeLog('secondary rate limit hit, retrying in ms', delay);
+				await new Promise((resolve) => setTimeout(resolve, delay));
+			}
+		}
+	}
+
+	// Labels are looked up once per run, however many issues they are applied to.
+	private hasLabel(name: string): Promise<boolean> {
+		let check = this.labelChecks.get(name);
+		if (!check) {
+			check = this.withRetry(() => this.github.repoHasLabel(name));
+			this.labelChecks.set(name, check);
+		}
+		return check;
+	}
+
+	private ensureLabel(name: string, color: string): Promise<void> {
+		let creation = this.labelCreations.get(name);
+		if (!creation) {
+			creation = (async () => {
+				if (!(await this.hasLabel(name))) {
+					safeLog(`creating label ${name}`);
+					await this.withRetry(() => this.github.createLabel(name, color, ''));
+					this.labelChecks.set(name, Promise.resolve(true));
+				}
+			})();
+			this.labelCreations.set(name, creation);
+		}
+		return creation;
+	}
+
+	private async planChanges(labeling: Labeling): Promise<IssueChanges> {
+		const { config } = this;
+		const debug = !!this.options.debug;
+		const changes: IssueChanges = { labels: new Set(), assignees: new Set(), comments: [] };
+
+		const assignee = labeling.assignee;
+		if (assignee) {
+			safeLog('has assignee:', assignee);
+
+			if (debug) {
+				await this.ensureLabel(assignee, 'ffa5a1');
+				changes.labels.add(assignee);
+			}
+
+			const assigneeConfig = config.assignees?.[assignee];
+			if (assigneeConfig) {
+				safeLog(JSON.stringify({ assigneeConfig }));
+				if (assigneeConfig.assign && !debug) changes.assignees.add(assignee);
+				if (assigneeConfig.comment) changes.comments.push(assigneeConfig.comment);
+			} else if (!debug) {
+				changes.assignees.add(assignee);
+			}
+		} else if (config.randomAssignment && config.labels) {
+			safeLog('could not find assignee, picking a random one...');
+			const available = Object.keys(config.labels).reduce((acc, area) => {
+				const areaConfig = config.labels?.[area];
+				if (areaConfig?.assign) {
+					acc.push(...areaConfig.assign);
+				}
+				return acc;
+			}, [] as string[]);
+			if (available.length) {
+				// Shuffle the array
+				for (let i = available.length - 1; i > 0; i--) {
+					const j = Math.floor(Math.random() * (i + 1));
+					[available[i], available[j]] = [available[j], available[i]];
+				}
+				if (!debug) {
+					const randomSelection = available[0];
+					safeLog('assigning', randomSelection);
+					changes.labels.add('triage-needed');
+					changes.assignees.add(randomSelection);
+				}
+			} else {
+				safeLog('error assigning random: no assigness found');
+			}
+		}
+
+		const label = labeling.area;
+		if (label) {
+			safeLog(`adding label ${label} to issue ${labeling.number}`);
+
+			if (debug) {
+				await this.ensureLabel(label, 'f1d9ff');
+			}
+
+			const labelConfig = config.labels?.[label];
+			if (labelConfig?.applyLabel || debug) changes.labels.add(label);
+			if (labelConfig?.comment) changes.comments.push(labelConfig.comment);
+			for (const labelAssignee of labelConfig?.assign ?? []) {
+				changes.assignees.add(labelAssignee);
+			}
+		}
+
+		return changes;
+	}
+
+	private async applyLabeling(labeling: Labeling): Promise<void> {
+		const issue = this.github.getIssueByNumber(labeling.number);
+		const issueData = await this.withRetry(() => issue.getIssue());
+
+		if (!this.options.debug && issueData.assignee) {
+			safeLog('skipping, already assigned to: ', issueData.assignee);
+			return;
+		}
+
+		const changes = await this.planChanges(labeling);
+		for (const label of changes.labels) {
+			if (!(await this.hasLabel(label))) {
+				throw Error(`Action could not execute becuase label ${label} is not defined.`);
+			}
+		}
+
+		await Promise.all<any>([
+			changes.labels.size && this.withRetry(() => issue.addLabels([...changes.labels])),
+			changes.assignees.size && this.withRetry(() => issue.addAssignees([...changes.assignees])),
+			...changes.comments.map((body) => this.withRetry(() => issue.postComment(body))),
+		]);
+	}
+}
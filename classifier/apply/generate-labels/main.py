@@ -7,9 +7,11 @@ import joblib
 import json
 import sys
 import os.path
+import numpy as np
 
 # Allow pickling the snowball stemmer to work right
 sys.path.insert(0, ".")
+from utils import top_k  # noqa
 
 BASE_PATH = os.path.join(os.path.dirname(__file__), "..")
 MODEL_PATH = os.path.abspath(os.path.join(BASE_PATH, "..", "blobStorage"))
@@ -30,43 +32,44 @@ def loadClassifier(classification):
 area_classifier = loadClassifier("area")
 assignee_classifier = loadClassifier("assignee")
 
-def get_classification(issue_data, classifier):
-    categories = apply_classifier(classifier, issue_data)
-    if len(categories) > 0:
-        return categories[0]
-    return None
 
-def apply_classifier(classifier, text):
-    return predict(
+def predict_batch(text_clf, target_names, texts, min_prob, ignore_labels, k=1):
+    if len(texts) == 0:
+        return []
+
+    probs = text_clf.predict_proba(texts)
+    ignore_mask = np.isin(target_names, ignore_labels)
+    indices, values = top_k(probs, k, ignore_mask)
+
+    return [
+        [target_names[i] for i, p in zip(row_indices, row_values) if p > min_prob]
+        for row_indices, row_values in zip(indices, values)
+    ]
+
+
+def classify_batch(texts, classifier):
+    categories = predict_batch(
         classifier["text_clf"],
         classifier["target_names"],
-        text,
+        texts,
         classifier["min_prob"],
         classifier["ignore_labels"],
     )
-
-
-def predict(text_clf, target_names, text, min_prob, ignore_labels):
-    probs = text_clf.predict_proba([text])[0]
-    best = sorted(enumerate(probs), key=lambda p: -p[1])
-
-
-    return [
-        target_names[i]
-        for i, p in best
-        if p > min_prob and target_names[i] not in ignore_labels
-    ]
+    return [c[0] if len(c) > 0 else None for c in categories]
 
 
 def main(debug=False):
     results = []
     with open(os.path.join(BASE_PATH, "issue_data.json")) as f:
         issue_data = json.load(f)
-        for issue in issue_data:
+        contents = [issue["contents"] for issue in issue_data]
+        areas = classify_batch(contents, area_classifier)
+        assignees = classify_batch(contents, assignee_classifier)
+        for issue, area, assignee in zip(issue_data, areas, assignees):
             result = {
                 "number": issue["number"],
-                "area": get_classification(issue["contents"], loadClassifier("area")),
-                "assignee": get_classification(issue["contents"], loadClassifier("assignee")),
+                "area": area,
+                "assignee": assignee,
                 "contents": issue["contents"],
             }
             results.append(result)
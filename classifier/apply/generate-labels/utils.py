@@ -5,6 +5,7 @@
 
 from sklearn.feature_extraction.text import CountVectorizer
 from nltk.stem import SnowballStemmer
+import numpy as np
 
 # Keep seprate from service.py because of something to do with pickle?
 
@@ -15,3 +16,35 @@ class StemmedCountVectorizer(CountVectorizer):
     def build_tokenizer(self):
         tokenizer = super(StemmedCountVectorizer, self).build_tokenizer()
         return lambda doc: ([stemmer.stem(w) for w in tokenizer(doc)])
+
+
+def top_k(probs, k, ignore_mask=None):
+    """Rank the k most probable classes of each row of a probability matrix.
+
+    Uses a partition so only the selected k columns are sorted. Ties go to the
+    lowest class index, as with a stable sort of the whole row. Classes set in
+    the boolean `ignore_mask` are never selected. Returns (indices, values),
+    each of shape (n_rows, k), best first.
+    """
+    probs = np.atleast_2d(np.asarray(probs, dtype=float))
+    if ignore_mask is not None:
+        probs = np.where(ignore_mask, -np.inf, probs)
+
+    n_rows, n_classes = probs.shape
+    k = min(k, n_classes)
+    # Everything above the k-th largest value, then as many of the classes tied
+    # with it as still fit, lowest index first. argpartition alone would pick
+    # among the tied classes arbitrarily.
+    kth = -np.partition(-probs, k - 1, axis=1)[:, k - 1 : k]
+    above = probs > kth
+    tied = probs == kth
+    room = k - above.sum(axis=1, keepdims=True)
+    selected = above | (tied & (np.cumsum(tied, axis=1) <= room))
+    candidates = np.nonzero(selected)[1].reshape(n_rows, k)
+    candidate_probs = np.take_along_axis(probs, candidates, axis=1)
+
+    order = np.lexsort((candidates, -candidate_probs), axis=1)
+    return (
+        np.take_along_axis(candidates, order, axis=1),
+        np.take_along_axis(candidate_probs, order, axis=1),
+    )
@@ -0,0 +1,177 @@
+/*---------------------------------------------------------------------------------------------
+ *  Copyright (c) Microsoft Corporation. All rights reserved.
+ *  Licensed under the MIT License. See LICENSE in the project root for license information.
+ *--------------------------------------------------------------------------------------------*/
+
+import { expect } from 'chai';
+import { mkdtempSync, readFileSync, rmSync, writeFileSync } from 'fs';
+import { createServer, Server } from 'http';
+import { AddressInfo } from 'net';
+import { tmpdir } from 'os';
+import { join } from 'path';
+import { readSyncState } from '../../../common/issueSync';
+import { JSONOutputLine, sync } from './download';
+
+const PAGE_SIZE = 2;
+
+type MockIssue = { number: number; title: string; updatedAt: string };
+
+const issueNode = (issue: MockIssue) => ({
+	body: 'body of ' + issue.number,
+	title: issue.title,
+	number: issue.number,
+	createdAt: '2020-01-01T00:00:00Z',
+	updatedAt: issue.updatedAt,
+	userContentEdits: { nodes: [] },
+	assignees: { nodes: [] },
+	labels: { nodes: [{ name: 'bug' }] },
+	timelineItems: { nodes: [] },
+});
+
+// Serves the subset of the GraphQL API used by sync, over a mutable list of issues.
+const mockGraphQL = (issues: MockIssue[]) => {
+	const queries: string[] = [];
+	const server = createServer((req, res) => {
+		let body = '';
+		req.on('data', (chunk) => (body += chunk));
+		req.on('end', () => {
+			const query: string = JSON.parse(body).query;
+			queries.push(query);
+
+			let data;
+			if (!query.includes('issues(')) {
+				data = { repository: { createdAt: '2020-01-01T00:00:00Z' } };
+			} else {
+				const since = +new Date(/since: "([^"]+)"/.exec(query)![1]);
+				const after = /after: "(\d+)"/.exec(query);
+				const matching = issues
+					.filter((issue) => +new Date(issue.updatedAt) >= since)
+					.sort((a, b) => +new Date(a.updatedAt) - +new Date(b.updatedAt));
+				const start = after ? +after[1] : 0;
+				const end = Math.min(start + PAGE_SIZE, matching.length);
+				data = {
+					repository: {
+						issues: {
+							pageInfo: {
+								endCursor: end ? '' + end : null,
+								hasNextPage: end < matching.length,
+							},
+							nodes: matching.slice(start, end).map(issueNode),
+						},
+					},
+					rateLimit: { cost: 1, remaining: 5000, resetAt: new Date().toISOString() },
+				};
+			}
+			res.writeHead(200, { 'Content-Type': 'application/json' });
+			res.end(JSON.stringify({ data }));
+		});
+	});
+	return { server, queries };
+};
+
+const listen = (server: Server) =>
+	new Promise<string>((resolve) =>
+		server.listen(0, '127.0.0.1', () =>
+			resolve(`http://127.0.0.1:${(server.address() as AddressInfo).port}/graphql`),
+		),
+	);
+
+const readDump = (dir: string): JSONOutputLine[] =>
+	readFileSync(join(dir, 'issues.json'), { encoding: 'utf8' })
+		.split('\n')
+		.filter((line) => line)
+		.map((line) => JSON.parse(line));
+
+describe('FetchIssues sync', () => {
+	let dir: string;
+	let server: Server;
+
+	beforeEach(() => {
+		dir = mkdtempSync(join(tmpdir(), 'fetch-issues-'));
+	});
+
+	afterEach(() => {
+		server?.close();
+		rmSync(dir, { recursive: true, force: true });
+	});
+
+	it('Fetches every issue on the first sync', async () => {
+		const issues = [1, 2, 3, 4, 5, 6, 7].map((number) => ({
+			number,
+			title: 'issue ' + number,
+			updatedAt: `202${number % 4}-06-01T00:00:00Z`,
+		}));
+		const mock = mockGraphQL(issues);
+		server = mock.server;
+		const endpoint = await listen(server);
+
+		await sync({ owner: 'o', repo: 'r' }, { dir, endpoint, token: 'token', concurrency: 3 });
+
+		expect(readDump(dir).map((issue) => issue.number)).to.deep.equal([1, 2, 3, 4, 5, 6, 7]);
+		expect(readDump(dir)[0].labels).to.deep.equal(['bug']);
+		const state = readSyncState(join(dir, 'issues.state.json'));
+		expect(state.pending).to.be.undefined;
+		expect(state.updatedAt).to.be.a('string');
+	});
+
+	it('Merges only the issues updated since the last sync', async () => {
+		const issues = [1, 2, 3].map((number) => ({
+			number,
+			title: 'issue ' + number,
+			updatedAt: '2021-06-01T00:00:00Z',
+		}));
+		const mock = mockGraphQL(issues);
+		server = mock.server;
+		const endpoint = await listen(server);
+
+		await sync({ owner: 'o', repo: 'r' }, { dir, endpoint, token: 'token' });
+		const since = readSyncState(join(dir, 'issues.state.json')).updatedAt as string;
+
+		issues[1] = { number: 2, title: 'renamed', updatedAt: new Date(+new Date(since) + 1).toISOString() };
+		issues.push({ number: 4, title: 'issue 4', updatedAt: issues[1].updatedAt });
+		mock.queries.length = 0;
+
+		await sync({ owner: 'o', repo: 'r' }, { dir, endpoint, token: 'token', concurrency: 1 });
+
+		expect(mock.queries).to.have.length(1);
+		expect(mock.queries[0]).to.contain(`since: "${since}"`);
+		const dump = readDump(dir);
+		expect(dump.map((issue) => issue.number)).to.deep.equal([1, 2, 3, 4]);
+		expect(dump[1].title).to.equal('renamed');
+	});
+
+	it('Resumes an interrupted sync from its cursor', async () => {
+		const issues = [1, 2, 3, 4, 5].map((number) => ({
+			number,
+			title: 'issue ' + number,
+			updatedAt: `2021-06-0${number}T00:00:00Z`,
+		}));
+		const mock = mockGraphQL(issues);
+		server = mock.server;
+		const endpoint = await listen(server);
+
+		// The first page of the only window was fetched before the interruption.
+		writeFileSync(
+			join(dir, 'issues.json'),
+			[1, 2].map((number) => JSON.stringify({ number, title: 'issue ' + number })).join('\n') + '\n',
+		);
+		writeFileSync(
+			join(dir, 'issues.state.json'),
+			JSON.stringify({
+				pending: {
+					startedAt: '2022-01-01T00:00:00.000Z',
+					windows: [{ since: '2020-01-01T00:00:00.000Z', cursor: '2' }],
+				},
+			}),
+		);
+
+		await sync({ owner: 'o', repo: 'r' }, { dir, endpoint, token: 'token' });
+
+		expect(mock.queries[0]).to.contain('after: "2"');
+		expect(mock.queries).to.have.length(2);
+		expect(readDump(dir).map((issue) => issue.number)).to.deep.equal([1, 2, 3, 4, 5]);
+		expect(readSyncState(join(dir, 'issues.state.json'))).to.deep.equal({
+			updatedAt: '2022-01-01T00:00:00.000Z',
+		});
+	});
+});
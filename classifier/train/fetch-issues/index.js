@@ -4,24 +4,65 @@
  *  Licensed under the MIT License. See LICENSE in the project root for license information.
  *--------------------------------------------------------------------------------------------*/
 Object.defineProperty(exports, "__esModule", { value: true });
+const child_process_1 = require("child_process");
 const fs_1 = require("fs");
 const path_1 = require("path");
 const Action_1 = require("../../../common/Action");
 const utils_1 = require("../../../common/utils");
+const blobStorage_1 = require("../../blobStorage");
 const createDataDir_1 = require("./createDataDir");
 const download_1 = require("./download");
 const endCursor = (0, utils_1.getInput)('cursor');
+const incremental = !!(0, utils_1.getInput)('incremental');
 const owner = (0, utils_1.getRequiredInput)('owner');
 const repo = (0, utils_1.getRequiredInput)('repo');
 const areas = (0, utils_1.getRequiredInput)('areas').split('|');
 const assignees = (0, utils_1.getRequiredInput)('assignees').split('|');
+const blobContainer = (0, utils_1.getInput)('blobContainerName');
+if (incremental && !blobContainer) {
+    throw Error('Input incremental needs blobContainerName, to keep issues.json between runs');
+}
+const blobStorageDir = (0, path_1.join)(__dirname, '..', '..', 'blobStorage');
+// An incremental sync starts from the dump and sync state uploaded by the previous run.
+const restorePreviousSync = async (container) => {
+    try {
+        await (0, blobStorage_1.downloadBlobFile)('issues.json.zip', container);
+        (0, child_process_1.execSync)(`unzip -o -q -j ${(0, path_1.join)(blobStorageDir, 'issues.json.zip')} -d ${__dirname}`);
+        (0, fs_1.unlinkSync)((0, path_1.join)(blobStorageDir, 'issues.json.zip'));
+        await (0, blobStorage_1.downloadBlobFile)('issues.state.json', container);
+        (0, fs_1.copyFileSync)((0, path_1.join)(blobStorageDir, 'issues.state.json'), (0, path_1.join)(__dirname, 'issues.state.json'));
+    }
+    catch {
+        (0, utils_1.safeLog)('could not restore previous sync, syncing from scratch');
+    }
+};
+// Also after a failed sync, whose progress the next run then resumes.
+const saveSync = async (container) => {
+    if (!(0, fs_1.existsSync)((0, path_1.join)(__dirname, 'issues.json')))
+        return;
+    (0, child_process_1.execSync)(`zip -q ${(0, path_1.join)(blobStorageDir, 'issues.json.zip')} ${(0, path_1.join)(__dirname, 'issues.json')}`);
+    await (0, blobStorage_1.uploadBlobFile)('issues.json.zip', container);
+    if ((0, fs_1.existsSync)((0, path_1.join)(__dirname, 'issues.state.json'))) {
+        (0, fs_1.copyFileSync)((0, path_1.join)(__dirname, 'issues.state.json'), (0, path_1.join)(blobStorageDir, 'issues.state.json'));
+        await (0, blobStorage_1.uploadBlobFile)('issues.state.json', container);
+    }
+};
 class FetchIssues extends Action_1.Action {
     constructor() {
         super(...arguments);
         this.id = 'Classifier/Train/FetchIssues';
     }
     async onTriggered() {
-        if (endCursor) {
+        if (incremental && blobContainer) {
+            await restorePreviousSync(blobContainer);
+            try {
+                await (0, download_1.sync)({ owner, repo });
+            }
+            finally {
+                await saveSync(blobContainer);
+            }
+        }
+        else if (endCursor) {
             await (0, download_1.download)({ owner, repo }, endCursor);
         }
         else {
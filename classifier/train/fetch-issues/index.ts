@@ -3,24 +3,67 @@
  *  Licensed under the MIT License. See LICENSE in the project root for license information.
  *--------------------------------------------------------------------------------------------*/
 
-import { statSync } from 'fs';
+import { execSync } from 'child_process';
+import { copyFileSync, existsSync, statSync, unlinkSync } from 'fs';
 import { join } from 'path';
 import { Action } from '../../../common/Action';
-import { getInput, getRequiredInput } from '../../../common/utils';
+import { getInput, getRequiredInput, safeLog } from '../../../common/utils';
+import { downloadBlobFile, uploadBlobFile } from '../../blobStorage';
 import { createDataDirectories } from './createDataDir';
-import { download } from './download';
+import { download, sync } from './download';
 
 const endCursor = getInput('cursor');
+const incremental = !!getInput('incremental');
 const owner = getRequiredInput('owner');
 const repo = getRequiredInput('repo');
 const areas = getRequiredInput('areas').split('|');
 const assignees = getRequiredInput('assignees').split('|');
+const blobContainer = getInput('blobContainerName');
+
+if (incremental && !blobContainer) {
+	throw Error('Input incremental needs blobContainerName, to keep issues.json between runs');
+}
+
+const blobStorageDir = join(__dirname, '..', '..', 'blobStorage');
+
+// An incremental sync starts from the dump and sync state uploaded by the previous run.
+const restorePreviousSync = async (container: string) => {
+	try {
+		await downloadBlobFile('issues.json.zip', container);
+		execSync(`unzip -o -q -j ${join(blobStorageDir, 'issues.json.zip')} -d ${__dirname}`);
+		unlinkSync(join(blobStorageDir, 'issues.json.zip'));
+		await downloadBlobFile('issues.state.json', container);
+		copyFileSync(join(blobStorageDir, 'issues.state.json'), join(__dirname, 'issues.state.json'));
+	} catch {
+		safeLog('could not restore previous sync, syncing from scratch');
+	}
+};
+
+// Also after a failed sync, whose progress the next run then resumes.
+const saveSync = async (container: string) => {
+	if (!existsSync(join(__dirname, 'issues.json'))) return;
+
+	execSync(`zip -q ${join(blobStorageDir, 'issues.json.zip')} ${join(__dirname, 'issues.json')}`);
+	await uploadBlobFile('issues.json.zip', container);
+
+	if (existsSync(join(__dirname, 'issues.state.json'))) {
+		copyFileSync(join(__dirname, 'issues.state.json'), join(blobStorageDir, 'issues.state.json'));
+		await uploadBlobFile('issues.state.json', container);
+	}
+};
 
 class FetchIssues extends Action {
 	id = 'Classifier/Train/FetchIssues';
 
 	async onTriggered() {
-		if (endCursor) {
+		if (incremental && blobContainer) {
+			await restorePreviousSync(blobContainer);
+			try {
+				await sync({ owner, repo });
+			} finally {
+				await saveSync(blobContainer);
+			}
+		} else if (endCursor) {
 			await download({ owner, repo }, endCursor);
 		} else {
 			try {
@@ -0,0 +1,312 @@
+# ---------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License. See LICENSE in the project root for license information.
+# --------------------------------------------------------------------------------------------*/
+
+# Distills the deep (BERT) classifiers into the classic SGD pipeline. Issues
+# that are not part of the human labelled training data are labelled with the
+# deep model's outputs as soft targets, and the SGD pipeline is trained on both.
+#
+# Usage: python distill.py <directory containing area_model and assignee_model>
+#        [--use-cuda]
+
+from simpletransformers.classification import ClassificationModel
+from sklearn.utils import Bunch
+from scipy.special import softmax
+import numpy as np
+import argparse
+import json
+import sys
+import re
+import os
+
+sys.path.insert(0, ".")
+from utils import top_k  # noqa
+from generate import (  # noqa
+    BASE_PATH,
+    PROB_EXPLORATION_RATE,
+    fit_counts,
+    load_test,
+    load_train,
+    new_text_clf,
+    weighted_result,
+    write_model_to_file,
+)
+from evaluate import evaluate_probabilities, print_report  # noqa
+
+# classifier-deep's dataset.py, for the split its models were trained on. Last
+# on the path so that its dedup.py does not shadow this directory's copy.
+DEEP_DATASET_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "..",
+    "..",
+    "classifier-deep",
+    "train",
+    "vm-filesystem",
+    "classifier",
+)
+sys.path.append(DEEP_DATASET_DIR)
+from dataset import is_test  # noqa
+
+ISSUES_PATH = os.path.join(BASE_PATH, "fetch-issues", "issues.json")
+REPORT_PATH = os.path.join(BASE_PATH, "distillation.json")
+
+# Softens the deep model's logits so the runner-up labels carry some weight.
+TEMPERATURE = 2.0
+
+# Each soft labelled issue contributes one weighted row per top label.
+SOFT_TOP_K = 3
+
+# Weight of a soft labelled issue relative to a human labelled one.
+SOFT_WEIGHT = 0.5
+
+# Issues per model.predict call, so labelling the whole history has bounded memory.
+PREDICT_BATCH_SIZE = 1024
+
+# The substitutions of normalizeIssue in common/utils.ts, in order.
+CLEANSE_PATTERNS = [
+    (re.compile(r"<!--.*-->"), ""),
+    (re.compile(r".* version: .*"), ""),
+    (re.compile(r"issue type: .*"), ""),
+    (re.compile(r"vs ?code"), ""),
+    (re.compile(r"we have written.*please paste."), ""),
+    (re.compile(r"steps to reproduce:"), ""),
+    (re.compile(r"does this issue occur when all extensions are disabled.*"), ""),
+    (re.compile(r"!?\[[^\]]*\]\([^)]*\)"), ""),
+    (re.compile(r"\s+"), " "),
+    (re.compile(r"```[^`]*?```"), ""),
+]
+
+
+def issue_number(filename):
+    return int(os.path.splitext(os.path.basename(filename))[0])
+
+
+def cleanse(text):
+    out = (text or "").lower()
+    for pattern, replacement in CLEANSE_PATTERNS:
+        out = pattern.sub(replacement, out)
+
+    while "<details>" in out and out.find("</details>") > out.find("<details>"):
+        out = out[: out.find("<details>")] + out[out.find("</details>") + 10 :]
+
+    return out
+
+
+def issue_text(issue):
+    """An issue as createDataDir.ts writes it to train_data, via normalizeIssue."""
+    return cleanse(issue["title"]) + "\n\n" + cleanse(issue["body"])
+
+
+def load_unlabeled(labeled):
+    texts = []
+    with open(ISSUES_PATH) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            issue = json.loads(line)
+            if issue["number"] not in labeled:
+                texts.append(issue_text(issue))
+    return texts
+
+
+def load_deep_model(deep_model_dir, category, use_cuda=False):
+    model_dir = os.path.join(deep_model_dir, category + "_model")
+    with open(os.path.join(model_dir, "target_names.json")) as fp:
+        target_names = json.load(fp)
+
+    model = ClassificationModel(
+        "bert", model_dir, num_labels=len(target_names), use_cuda=use_cuda
+    )
+    return model, target_names
+
+
+def deep_probabilities(model, texts, temperature=TEMPERATURE):
+    if len(texts) == 0:
+        return np.zeros((0, model.num_labels))
+    raw_outputs = [
+        np.asarray(model.predict(list(texts[i : i + PREDICT_BATCH_SIZE]))[1])
+        for i in range(0, len(texts), PREDICT_BATCH_SIZE)
+    ]
+    return softmax(np.concatenate(raw_outputs) / temperature, axis=1)
+
+
+def held_out_from_deep(filenames):
+    """Mask of the issues classifier-deep did not train on.
+
+    Both data directories name issue files <number>.txt. Only holds if the
+    deep models were trained on the same issues with the default split.
+    """
+    return np.array(
+        [is_test(os.path.basename(filename)) for filename in filenames], dtype=bool
+    )
+
+
+def select_rows(data, keep):
+    rows = np.flatnonzero(keep)
+    return Bunch(
+        data=[data.data[i] for i in rows],
+        target=data.target[rows],
+        target_names=data.target_names,
+        filenames=data.filenames[rows],
+    )
+
+
+def coverage(probabilities, min_prob):
+    """Share of rows whose most probable label beats `min_prob`."""
+    if len(probabilities) == 0:
+        return 0.0
+    return float(np.mean(probabilities.max(axis=1) > min_prob))
+
+
+def matched_min_prob(probabilities, target_coverage):
+    """The min_prob at which about `target_coverage` of the rows are guessed."""
+    top_probs = np.sort(probabilities.max(axis=1))[::-1]
+    guesses = int(round(target_coverage * len(top_probs)))
+    return float(top_probs[guesses]) if guesses < len(top_probs) else 0.0
+
+
+def soft_rows(probs):
+    """Expand soft targets into (row, label, weight) triples of the top labels."""
+    indices, values = top_k(probs, SOFT_TOP_K)
+    rows = np.repeat(np.arange(len(probs)), indices.shape[1])
+    labels = indices.ravel()
+    weights = values.ravel() / values.sum(axis=1).repeat(indices.shape[1])
+    return rows, labels, weights * SOFT_WEIGHT
+
+
+def fit_distilled(train, target_names, unlabeled_texts, soft_probs):
+    label_index = {name: i for i, name in enumerate(target_names)}
+
+    # Human labels are mapped onto the deep model's label space.
+    hard_labels = np.array(
+        [label_index.get(name, -1) for name in train.target_names], dtype=int
+    )[train.target]
+    hard_rows = np.flatnonzero(hard_labels >= 0)
+    soft_index, soft_labels, soft_weights = soft_rows(soft_probs)
+
+    vect = new_text_clf().named_steps["vect"]
+    counts = vect.fit_transform(
+        [train.data[i] for i in hard_rows] + list(unlabeled_texts)
+    )
+
+    rows = np.concatenate([np.arange(len(hard_rows)), len(hard_rows) + soft_index])
+    target = np.concatenate([hard_labels[hard_rows], soft_labels])
+    sample_weight = np.concatenate([np.ones(len(hard_rows)), soft_weights])
+
+    return fit_counts(vect, counts[rows], target, sample_weight)
+
+
+def choose_min_prob(probabilities, target_names, test):
+    top_indices, top_probs = top_k(probabilities, 1)
+    first_correct = np.array(target_names)[top_indices[:, 0]] == np.array(
+        test.target_names
+    )[test.target]
+    first_ignored = np.zeros(len(first_correct), dtype=bool)
+
+    best_res = None
+    best_min_prob = None
+    for min_prob in range(0, 100, PROB_EXPLORATION_RATE):
+        min_prob /= 100
+        res = weighted_result(
+            top_probs[:, 0], first_ignored, first_correct, min_prob
+        )
+        if best_res is None or res > best_res:
+            best_res = res
+            best_min_prob = min_prob
+    return best_min_prob, best_res
+
+
+def compare(distilled_probs, distilled_names, deep_probs, deep_names, min_prob, test):
+    """Report both models on `test`, the deep one at the distilled coverage.
+
+    The deep model's thresholds.json are cutoffs on raw logits per label and
+    target precision, so rather than the apply step's confidence rules, its
+    softmax threshold is picked to guess as many issues as the distilled model.
+    """
+    deep_min_prob = matched_min_prob(deep_probs, coverage(distilled_probs, min_prob))
+    return {
+        "distilled": evaluate_probabilities(
+            distilled_probs, distilled_names, min_prob, test
+        ),
+        "deep": evaluate_probabilities(deep_probs, deep_names, deep_min_prob, test),
+    }
+
+
+def distill_category(deep_model_dir, category, use_cuda=False):
+    train = load_train(category)
+    test = load_test(category)
+    model, target_names = load_deep_model(deep_model_dir, category, use_cuda)
+
+    labeled = {
+        issue_number(filename)
+        for filename in list(train.filenames) + list(test.filenames)
+    }
+    unlabeled_texts = load_unlabeled(labeled)
+    print(category + ":", len(unlabeled_texts), "soft labelled issues")
+
+    soft_probs = deep_probabilities(model, unlabeled_texts)
+    text_clf = fit_distilled(train, target_names, unlabeled_texts, soft_probs)
+
+    # Labels that never occur in the fitted data have no predict_proba column.
+    distilled_names = [target_names[c] for c in text_clf.classes_]
+    distilled_probs = text_clf.predict_proba(test.data)
+    min_prob, res = choose_min_prob(distilled_probs, distilled_names, test)
+    print("Probability threshold: {0}".format(min_prob))
+    print("Weighted result: {0}".format(res))
+
+    write_model_to_file(category, distilled_names, min_prob, [], text_clf)
+
+    # The classic test split was drawn independently of the deep model's, so
+    # part of it is deep training data. Both models are also compared on the
+    # remainder, which neither was trained on.
+    held_out = held_out_from_deep(test.filenames)
+    overlap = int(np.count_nonzero(~held_out))
+    print(
+        category + ":",
+        overlap,
+        "of",
+        len(held_out),
+        "test issues are deep training data",
+    )
+
+    deep_probs = deep_probabilities(model, test.data, temperature=1.0)
+    return {
+        "deep_training_overlap": overlap,
+        "test": compare(
+            distilled_probs, distilled_names, deep_probs, target_names, min_prob, test
+        ),
+        "held_out_from_deep": compare(
+            distilled_probs[held_out],
+            distilled_names,
+            deep_probs[held_out],
+            target_names,
+            min_prob,
+            select_rows(test, held_out),
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("deep_model_dir")
+    parser.add_argument("--categories", nargs="+", default=["area", "assignee"])
+    parser.add_argument("--use-cuda", action="store_true")
+    args = parser.parse_args()
+
+    reports = {}
+    for category in args.categories:
+        reports[category] = distill_category(
+            args.deep_model_dir, category, args.use_cuda
+        )
+        for split in ("test", "held_out_from_deep"):
+            for kind, report in reports[category][split].items():
+                print_report(category + " (" + kind + ", " + split + ")", report)
+
+    with open(REPORT_PATH, "w") as outfile:
+        json.dump(reports, outfile, indent=4)
+
+
+if __name__ == "__main__":
+    main()
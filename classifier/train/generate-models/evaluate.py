@@ -1,5 +1,7 @@
 from sklearn.datasets import load_files
-from collections import defaultdict
+from scipy import sparse
+from multiprocessing import Pool, cpu_count
+import numpy as np
 import os
 import joblib
 import json
@@ -12,6 +14,9 @@ sys.path.insert(0, ".")
 BASE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 DATA_DIR = os.path.join(BASE_PATH, "train_data")
 MODEL_DIR = os.path.join(BASE_PATH, "..", "blobStorage")
+REPORT_PATH = os.path.join(BASE_PATH, "evaluation.json")
+
+CATEGORIES = ["area", "assignee"]
 
 
 def load_test_data(category):
@@ -33,46 +38,132 @@ def load_classifier(category):
         return classifier
 
 
+def safe_ratio(num, denom):
+    return None if denom == 0 else num / denom
+
+
 def divide(num, denom):
     ratio = "" if denom == 0 else str(int((num / denom) * 100)) + "%"
     return f"{ratio} ({num}/{denom})"
 
 
-for category in ["area", "assignee"]:
-    print(category + ": ")
+def label_report(correct, items, guesses):
+    return {
+        "correct": int(correct),
+        "items": int(items),
+        "guesses": int(guesses),
+        "recall": safe_ratio(int(correct), int(items)),
+        "accuracy": safe_ratio(int(correct), int(guesses)),
+    }
+
+
+def evaluate_probabilities(probabilities, target_names, min_prob, test_data):
+    """Score a matrix of predicted probabilities against labelled test data.
+
+    Rows whose most probable label does not beat `min_prob`, or is
+    `__OTHER__`, count as skipped. Returns a JSON-serializable report with
+    per-label and overall recall/accuracy and the sparse confusion matrix of
+    the guesses that were made.
+    """
+    num_labels = len(target_names)
+    label_index = {name: i for i, name in enumerate(target_names)}
+
+    # Test labels are indexed by the test data's own names, which need not
+    # match the classifier's; unknown labels map to -1.
+    true_index = np.array(
+        [label_index.get(name, -1) for name in test_data.target_names], dtype=int
+    )[test_data.target]
+
+    predicted = np.argmax(probabilities, axis=1)
+    top_prob = probabilities[np.arange(len(predicted)), predicted]
+    guessed = top_prob > min_prob
+    if "__OTHER__" in label_index:
+        guessed &= predicted != label_index["__OTHER__"]
+    hit = guessed & (predicted == true_index)
+
+    items = np.bincount(true_index[true_index >= 0], minlength=num_labels)
+    guesses = np.bincount(predicted[guessed], minlength=num_labels)
+    correct = np.bincount(predicted[hit], minlength=num_labels)
+
+    known = guessed & (true_index >= 0)
+    confusion = sparse.coo_matrix(
+        (
+            np.ones(np.count_nonzero(known), dtype=int),
+            (true_index[known], predicted[known]),
+        ),
+        shape=(num_labels, num_labels),
+    )
+    confusion.sum_duplicates()
+
+    return {
+        "min_prob": min_prob,
+        "labels": {
+            name: label_report(correct[i], items[i], guesses[i])
+            for i, name in enumerate(target_names)
+        },
+        "overall": label_report(correct.sum(), len(true_index), guesses.sum()),
+        "confusion": [
+            {"true": target_names[t], "predicted": target_names[p], "count": int(n)}
+            for t, p, n in zip(confusion.row, confusion.col, confusion.data)
+        ],
+    }
+
+
+def evaluate_classifier(text_clf, target_names, min_prob, test_data):
+    return evaluate_probabilities(
+        text_clf.predict_proba(test_data.data), target_names, min_prob, test_data
+    )
+
 
-    test_data = load_test_data(category)
+def evaluate_category(category):
     classifier_data = load_classifier(category)
-    classifier = classifier_data["text_clf"]
-    target_names = classifier_data["target_names"]
-    min_prob = classifier_data["min_prob"]
-
-    correct = defaultdict(int)
-    items = defaultdict(int)
-    guesses = defaultdict(int)
-
-    predictions = classifier.predict_proba(test_data.data)
-    for prediction, true_index in zip(predictions, test_data.target):
-        true_class = target_names[true_index]
-        items[true_class] += 1
-
-        top_class, top_prob = max(
-            [(target_names[c], prob) for c, prob in enumerate(prediction)],
-            key=lambda p: p[1],
-        )
+    report = evaluate_classifier(
+        classifier_data["text_clf"],
+        classifier_data["target_names"],
+        classifier_data["min_prob"],
+        load_test_data(category),
+    )
+    report["category"] = category
+    return report
+
 
-        if top_prob > min_prob and top_class != "__OTHER__":
-            guesses[top_class] += 1
-            if top_class == true_class:
-                correct[top_class] += 1
+def print_report(category, report):
+    print(category + ": ")
 
-    for target_name in target_names:
+    for target_name, label in report["labels"].items():
         print(target_name + ": ")
-        print("\tRecall", divide(correct[target_name], items[target_name]))
-        print("\tAccuracy", divide(correct[target_name], guesses[target_name]))
+        print("\tRecall", divide(label["correct"], label["items"]))
+        print("\tAccuracy", divide(label["correct"], label["guesses"]))
 
+    overall = report["overall"]
     print()
     print("Overall: ")
-    print("Recall", divide(sum(correct.values()), sum(items.values())))
-    print("Accuracy", divide(sum(correct.values()), sum(guesses.values())))
+    print("Recall", divide(overall["correct"], overall["items"]))
+    print("Accuracy", divide(overall["correct"], overall["guesses"]))
     print()
+
+
+def main(categories=CATEGORIES, report_path=REPORT_PATH):
+    try:
+        cpus = min(cpu_count(), len(categories))
+    except NotImplementedError:
+        cpus = 1
+
+    with Pool(cpus) as pool:
+        reports = pool.map(evaluate_category, categories)
+
+    for category, report in zip(categories, reports):
+        print_report(category, report)
+
+    with open(report_path, "w") as outfile:
+        json.dump(
+            {category: report for category, report in zip(categories, reports)},
+            outfile,
+            indent=4,
+        )
+
+    return reports
+
+
+if __name__ == "__main__":
+    main()
@@ -11,9 +11,13 @@ from sklearn.ensemble import ExtraTreesClassifier
 from sklearn.ensemble import AdaBoostClassifier
 from sklearn.pipeline import Pipeline
 from sklearn.datasets import load_files
+from sklearn.utils import Bunch
 from sklearn import metrics
+from collections.abc import Sequence
+from scipy import sparse
 import numpy as np
 import joblib
+import hashlib
 import json
 from multiprocessing import Pool, cpu_count
 import multiprocessing as mp
@@ -21,7 +25,9 @@ import sys
 import os
 
 sys.path.insert(0, ".")
-from utils import StemmedCountVectorizer  # noqa
+from utils import StemmedCountVectorizer, stemmer, top_k  # noqa
+from dedup import deduplicate  # noqa
+from evaluate import evaluate_probabilities, print_report  # noqa
 
 CUTOFF_EXPLORATION_RATE = 5
 PROB_EXPLORATION_RATE = 3
@@ -30,11 +36,23 @@ SKIP_WEIGHT = 0
 CORRECT_WEIGHT = [1]
 INCORRECT_WEIGHT = -1.75
 
+# Only the first few guesses are ever reported by print_metrics.
+TOP_K = 3
+
 FILTER_DATA = False
 
+# Keep the stemmed train/test count matrices on disk between runs.
+PERSIST_COUNTS = False
+
+# Train on one document per cluster of near-duplicate issues and label. Off by
+# default, as it changes the training data of the models.
+DEDUPLICATE = False
+
 BASE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 MODEL_DIR = os.path.join(BASE_PATH, "..", "blobStorage")
 DATA_DIR = os.path.join(BASE_PATH, "train_data")
+COUNTS_DIR = os.path.join(BASE_PATH, "train_counts")
+DEDUP_DIR = os.path.join(BASE_PATH, "dedup_index")
 
 
 def new_text_clf():
@@ -73,16 +91,133 @@ def load_train(category):
     )
 
 
+def deduplicate_data(data, category):
+    keep = deduplicate(
+        data.data,
+        data.target,
+        os.path.join(DEDUP_DIR, category + ".npz"),
+        category + " train",
+    )
+    rows = np.flatnonzero(keep)
+    return Bunch(
+        data=[data.data[i] for i in rows],
+        target=data.target[rows],
+        target_names=data.target_names,
+        filenames=data.filenames[rows],
+    )
+
+
+def corpus_digest(train, test, vect):
+    """Identify the corpus and the settings it is counted with."""
+    digest = hashlib.sha1()
+    # The stemmer is module state of utils.py rather than a vectorizer param.
+    settings = (sorted(vect.get_params().items()), type(stemmer.stemmer).__name__)
+    digest.update(repr(settings).encode("utf-8"))
+    digest.update(b"\0")
+    for doc in list(train.data) + list(test.data):
+        digest.update(doc.encode("utf-8", "replace"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def load_counts(category, train, test):
+    """Stem and count the train and test corpora once per category.
+
+    Filtered fits slice rows of these matrices and only refit the TF-IDF and
+    SGD steps. With PERSIST_COUNTS the matrices are reused across runs for as
+    long as the corpus and the vectorizer settings are unchanged.
+    """
+    vect = new_text_clf().named_steps["vect"]
+    digest = corpus_digest(train, test, vect) if PERSIST_COUNTS else None
+    prefix = os.path.join(COUNTS_DIR, category)
+
+    if PERSIST_COUNTS and os.path.exists(prefix + "-counts.pickle"):
+        vect, cached_digest = joblib.load(prefix + "-counts.pickle")
+        if cached_digest == digest:
+            return Bunch(
+                vect=vect,
+                train=sparse.load_npz(prefix + "-train-counts.npz"),
+                test=sparse.load_npz(prefix + "-test-counts.npz"),
+            )
+
+    counts = Bunch(
+        vect=vect,
+        train=vect.fit_transform(train.data),
+        test=vect.transform(test.data),
+    )
+
+    if PERSIST_COUNTS:
+        if not os.path.exists(COUNTS_DIR):
+            os.makedirs(COUNTS_DIR)
+        sparse.save_npz(prefix + "-train-counts.npz", counts.train)
+        sparse.save_npz(prefix + "-test-counts.npz", counts.test)
+        joblib.dump((vect, digest), prefix + "-counts.pickle")
+
+    return counts
+
+
+def fit_counts(vect, counts, target, sample_weight=None):
+    text_clf = new_text_clf()
+    text_clf.steps[0] = ("vect", vect)
+    text_clf[1:].fit(counts, target, clf__sample_weight=sample_weight)
+    return text_clf
+
+
+class IndexedView(Sequence):
+    """Read-only view of the rows of `data` selected by `indices`."""
+
+    def __init__(self, data, indices):
+        self.data = data
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return IndexedView(self.data, self.indices[i])
+        return self.data[self.indices[i]]
+
+
 def filter_data(data, scores, cutoff):
-    for i, f in reversed(list(enumerate(scores))):
-        if f < cutoff:
-            del data.target_names[i]
-            for j, t in reversed(list(enumerate(data.target))):
-                if t == i:
-                    del data.data[j]
-                    data.target = np.delete(data.target, (j), axis=0)
-                elif t > i:
-                    data.target[j] -= 1
+    keep = np.asarray(scores) >= cutoff
+
+    remap = np.full(len(keep), -1)
+    remap[keep] = np.arange(np.count_nonzero(keep))
+    rows = np.flatnonzero(keep[data.target])
+
+    return Bunch(
+        data=IndexedView(data.data, rows),
+        target=remap[data.target[rows]],
+        target_names=[name for name, k in zip(data.target_names, keep) if k],
+    )
+
+
+def weighted_result(first_prob, first_ignored, first_correct, min_prob):
+    skipped = (first_prob < min_prob) | first_ignored
+    return np.mean(
+        np.where(
+            skipped,
+            SKIP_WEIGHT,
+            np.where(first_correct, CORRECT_WEIGHT[0], INCORRECT_WEIGHT),
+        )
+    )
+
+
+def top_predictions(top_classes, top_probs, min_prob):
+    predicted = []
+    for classes, probs in zip(top_classes, top_probs):
+        if probs[0] >= min_prob:
+            predicted.append(
+                [
+                    c
+                    for i, (c, p) in enumerate(zip(classes, probs))
+                    if i == 0 or p > min_prob
+                ]
+            )
+        else:
+            predicted.append(None)
+    return predicted
 
 
 def print_metrics(
@@ -181,7 +316,14 @@ def write_model_to_file(category, target_names, min_prob, ignore_labels, text_cl
 
 
 def find_best(
-    cutoff_method, scores, score_tuples, test, train, initial_prediction, category,
+    cutoff_method,
+    scores,
+    score_tuples,
+    test,
+    train,
+    counts,
+    initial_prediction,
+    category,
 ):
     best_res = None
     best_min_prob = None
@@ -192,63 +334,47 @@ def find_best(
     best_test = None
     best_ignore_labels = None
     best_clf = None
+    raw_train = train
 
     if not FILTER_DATA:
-        train = load_train(category)
-        text_clf = new_text_clf().fit(train.data, train.target)
-        probabilities = text_clf.predict_proba(test.data)
+        text_clf = fit_counts(counts.vect, counts.train, train.target)
+        probabilities = text_clf[1:].predict_proba(counts.test)
 
     for cutoff in range(0, 100, CUTOFF_EXPLORATION_RATE):
         cutoff /= 100
 
         if FILTER_DATA:
-            train = load_train(category)
-            filter_data(train, scores, cutoff)
+            train = filter_data(raw_train, scores, cutoff)
 
-            if len(train.target_names) < 1:
-                return
+            if len(train.target_names) < 2:
+                break
 
-            text_clf = new_text_clf().fit(train.data, train.target)
-            probabilities = text_clf.predict_proba(test.data)
+            text_clf = fit_counts(
+                counts.vect, counts.train[train.data.indices], train.target
+            )
+            probabilities = text_clf[1:].predict_proba(counts.test)
 
         ignore_labels = [name for name, f in score_tuples if f < cutoff]
+        ignore_mask = np.isin(train.target_names, ignore_labels)
+
+        top_indices, top_probs = top_k(probabilities, TOP_K)
+        top_classes = text_clf.classes_[top_indices]
+        first_class = top_classes[:, 0]
+        first_ignored = ignore_mask[first_class]
+        first_correct = np.array(train.target_names)[first_class] == np.array(
+            test.target_names
+        )[test.target]
 
         for min_prob in range(0, 100, PROB_EXPLORATION_RATE):
             min_prob /= 100
-            predicted = []
-
-            for prob in probabilities:
-                best = sorted(enumerate(prob), key=lambda p: -p[1])
-                if best[0][1] >= min_prob:
-                    predicted.append(
-                        [
-                            text_clf.classes_[index]
-                            for index, value in best
-                            if value > min_prob
-                        ]
-                    )
-                else:
-                    predicted.append(None)
-
-            res = np.mean(
-                [
-                    calc_score(
-                        predicted,
-                        target,
-                        train,
-                        test,
-                        ignore_labels,
-                        SKIP_WEIGHT,
-                        CORRECT_WEIGHT,
-                        INCORRECT_WEIGHT,
-                    )
-                    for predicted, target in zip(predicted, test.target)
-                ]
+
+            res = weighted_result(
+                top_probs[:, 0], first_ignored, first_correct, min_prob
             )
 
             if best_res is None or res > best_res:
                 best_ignore_labels = ignore_labels
-                best_prediction = predicted
+                best_prediction = top_predictions(top_classes, top_probs, min_prob)
                 best_cutoff = cutoff
                 best_method = cutoff_method
                 best_res = res
@@ -273,9 +399,13 @@ def find_best(
 def run_category(category):
     raw_test = load_test(category)
     raw_train = load_train(category)
+    if DEDUPLICATE:
+        raw_train = deduplicate_data(raw_train, category)
+
+    counts = load_counts(category, raw_train, raw_test)
 
-    text_clf = new_text_clf().fit(raw_train.data, raw_train.target)
-    initial_prediction = text_clf.predict(raw_test.data)
+    text_clf = fit_counts(counts.vect, counts.train, raw_train.target)
+    initial_prediction = text_clf[1:].predict(counts.test)
 
     score_map = {
         "precision": metrics.precision_score(
@@ -335,6 +465,7 @@ def run_category(category):
             score_tuples,
             raw_test,
             raw_train,
+            counts,
             initial_prediction,
             category,
         )
@@ -368,6 +499,17 @@ def run_category(category):
         category, best_train.target_names, best_min_prob, best_ignore_labels, best_clf
     )
 
+    print()
+    print_report(
+        category,
+        evaluate_probabilities(
+            best_clf[1:].predict_proba(counts.test),
+            best_train.target_names,
+            best_min_prob,
+            raw_test,
+        ),
+    )
+
 
 def main():
     categories = [
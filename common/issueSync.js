@@ -0,0 +1,138 @@
+"use strict";
+/*---------------------------------------------------------------------------------------------
+ *  Copyright (c) Microsoft Corporation. All rights reserved.
+ *  Licensed under the MIT License. See LICENSE in the project root for license information.
+ *--------------------------------------------------------------------------------------------*/
+Object.defineProperty(exports, "__esModule", { value: true });
+exports.syncIssues = exports.RateLimiter = exports.mergeIssues = exports.splitWindows = exports.writeSyncState = exports.readSyncState = exports.RATE_LIMIT_RESERVE = exports.SYNC_CONCURRENCY = void 0;
+const fs_1 = require("fs");
+const path_1 = require("path");
+const utils_1 = require("./utils");
+// Incremental sync of a JSONL issue dump. The range of updatedAt times since the
+// last sync is split into windows which are paged through concurrently, newest
+// issue versions are appended to the dump as they arrive, and the dump is merged
+// by issue number once every window is done. Progress is kept in a state file so
+// an interrupted sync resumes from the last page each window fetched.
+/** Default number of windows, and so of concurrent page fetches. */
+exports.SYNC_CONCURRENCY = 4;
+/** GraphQL points left untouched, so concurrent requests never exhaust the quota. */
+exports.RATE_LIMIT_RESERVE = 100;
+const readSyncState = (path) => (0, fs_1.existsSync)(path) ? JSON.parse((0, fs_1.readFileSync)(path, { encoding: 'utf8' })) : {};
+exports.readSyncState = readSyncState;
+const writeAtomic = (path, contents) => {
+    (0, fs_1.writeFileSync)(path + '.tmp', contents);
+    (0, fs_1.renameSync)(path + '.tmp', path);
+};
+const writeSyncState = (path, state) => writeAtomic(path, JSON.stringify(state, null, 2) + '\n');
+exports.writeSyncState = writeSyncState;
+/** Split [since, until) into `count` windows of equal duration, leaving the last one open. */
+const splitWindows = (since, until, count) => {
+    const start = +new Date(since);
+    const step = Math.max(+new Date(until) - start, 0) / Math.max(count, 1);
+    const windows = [];
+    for (let i = 0; i < count; i++) {
+        windows.push({
+            since: new Date(start + i * step).toISOString(),
+            until: i < count - 1 ? new Date(start + (i + 1) * step).toISOString() : undefined,
+        });
+    }
+    return windows;
+};
+exports.splitWindows = splitWindows;
+/** Rewrite a JSONL dump with one line per issue number, keeping the most recently updated. */
+const mergeIssues = (path) => {
+    if (!(0, fs_1.existsSync)(path))
+        return 0;
+    const issues = new Map();
+    for (const line of (0, fs_1.readFileSync)(path, { encoding: 'utf8' }).split('\n')) {
+        if (!line.trim())
+            continue;
+        const issue = JSON.parse(line);
+        const updatedAt = issue.updatedAt || 0;
+        const existing = issues.get(issue.number);
+        if (!existing || existing.updatedAt <= updatedAt) {
+            issues.set(issue.number, { updatedAt, line });
+        }
+    }
+    const lines = [...issues.entries()].sort(([a], [b]) => a - b).map(([, issue]) => issue.line);
+    writeAtomic(path, lines.length ? lines.join('\n') + '\n' : '');
+    return lines.length;
+};
+exports.mergeIssues = mergeIssues;
+/** Pauses requests while the remaining GraphQL quota is within the reserve. */
+class RateLimiter {
+    constructor(reserve = exports.RATE_LIMIT_RESERVE) {
+        this.reserve = reserve;
+        this.remaining = Infinity;
+        this.resetAt = 0;
+    }
+    update(rateLimit) {
+        this.remaining = rateLimit.remaining;
+        this.resetAt = +new Date(rateLimit.resetAt);
+    }
+    async wait() {
+        while (this.remaining <= this.reserve) {
+            const delay = Math.max(this.resetAt - Date.now(), 0) + 1000;
+            (0, utils_1.safeLog)('rate limit reserve reached, waiting ms', delay);
+            await new Promise((resolve) => setTimeout(resolve, delay));
+            if (Date.now() >= this.resetAt)
+                this.remaining = Infinity;
+        }
+    }
+}
+exports.RateLimiter = RateLimiter;
+/**
+ * Fetch every issue updated since the last sync into `dir`/issues.json, keeping
+ * progress in `dir`/issues.state.json.
+ * `fetchPage` loads one page of issues updated at or after `window.since`,
+ * oldest first, starting after `window.cursor`. `getStart` gives the start of
+ * the first sync, when there is no earlier one to continue from.
+ */
+const syncIssues = async (dir, fetchPage, getStart, { concurrency = exports.SYNC_CONCURRENCY, reserve = exports.RATE_LIMIT_RESERVE } = {}) => {
+    const dumpPath = (0, path_1.join)(dir, 'issues.json');
+    const statePath = (0, path_1.join)(dir, 'issues.state.json');
+    const state = (0, exports.readSyncState)(statePath);
+    if (state.pending) {
+        (0, utils_1.safeLog)('resuming sync started at', state.pending.startedAt);
+    }
+    else {
+        const startedAt = new Date().toISOString();
+        const since = state.updatedAt || (await getStart());
+        (0, utils_1.safeLog)('syncing issues updated since', since);
+        state.pending = { startedAt, windows: (0, exports.splitWindows)(since, startedAt, concurrency) };
+        (0, exports.writeSyncState)(statePath, state);
+    }
+    const pending = state.pending;
+    const limiter = new RateLimiter(reserve);
+    let fetched = 0;
+    await (0, utils_1.mapWithConcurrency)(pending.windows.slice(), concurrency, async (window) => {
+        const until = window.until ? +new Date(window.until) : Infinity;
+        for (;;) {
+            await limiter.wait();
+            const page = await fetchPage(window);
+            limiter.update(page.rateLimit);
+            const issues = page.issues.filter((issue) => issue.updatedAt < until);
+            if (issues.length) {
+                (0, fs_1.appendFileSync)(dumpPath, issues.map((issue) => JSON.stringify(issue)).join('\n') + '\n');
+                fetched += issues.length;
+            }
+            // Pages are ordered by updatedAt, so reaching `until` finishes the window.
+            const done = !page.hasNextPage || !page.endCursor || issues.length < page.issues.length;
+            if (done) {
+                pending.windows.splice(pending.windows.indexOf(window), 1);
+            }
+            else {
+                window.cursor = page.endCursor;
+            }
+            (0, exports.writeSyncState)(statePath, state);
+            (0, utils_1.safeLog)('fetched issues', fetched, 'quota', page.rateLimit.remaining);
+            if (done)
+                return;
+        }
+    });
+    const total = (0, exports.mergeIssues)(dumpPath);
+    (0, exports.writeSyncState)(statePath, { updatedAt: pending.startedAt });
+    (0, utils_1.safeLog)('synced issues', fetched, 'total', total);
+};
+exports.syncIssues = syncIssues;
+//# sourceMappingURL=issueSync.js.map
\ No newline at end of file
@@ -0,0 +1,175 @@
+/*---------------------------------------------------------------------------------------------
+ *  Copyright (c) Microsoft Corporation. All rights reserved.
+ *  Licensed under the MIT License. See LICENSE in the project root for license information.
+ *--------------------------------------------------------------------------------------------*/
+
+import { appendFileSync, existsSync, readFileSync, renameSync, writeFileSync } from 'fs';
+import { join } from 'path';
+import { mapWithConcurrency, safeLog } from './utils';
+
+// Incremental sync of a JSONL issue dump. The range of updatedAt times since the
+// last sync is split into windows which are paged through concurrently, newest
+// issue versions are appended to the dump as they arrive, and the dump is merged
+// by issue number once every window is done. Progress is kept in a state file so
+// an interrupted sync resumes from the last page each window fetched.
+
+/** Default number of windows, and so of concurrent page fetches. */
+export const SYNC_CONCURRENCY = 4;
+
+/** GraphQL points left untouched, so concurrent requests never exhaust the quota. */
+export const RATE_LIMIT_RESERVE = 100;
+
+export type RateLimit = { cost: number; remaining: number; resetAt: string };
+
+/** The updatedAt range [since, until) fetched by one worker. An open window has no until. */
+export type SyncWindow = { since: string; until?: string; cursor?: string };
+
+export type SyncState = {
+	/** Every issue updated before this time is in the dump. */
+	updatedAt?: string;
+	/** The sync in progress, if any. */
+	pending?: { startedAt: string; windows: SyncWindow[] };
+};
+
+export type SyncedIssue = { number: number; updatedAt: number };
+
+export type SyncPage<T extends SyncedIssue> = {
+	issues: T[];
+	endCursor: string | null;
+	hasNextPage: boolean;
+	rateLimit: RateLimit;
+};
+
+export type SyncOptions = {
+	concurrency?: number;
+	reserve?: number;
+};
+
+export const readSyncState = (path: string): SyncState =>
+	existsSync(path) ? JSON.parse(readFileSync(path, { encoding: 'utf8' })) : {};
+
+const writeAtomic = (path: string, contents: string) => {
+	writeFileSync(path + '.tmp', contents);
+	renameSync(path + '.tmp', path);
+};
+
+export const writeSyncState = (path: string, state: SyncState) =>
+	writeAtomic(path, JSON.stringify(state, null, 2) + '\n');
+
+/** Split [since, until) into `count` windows of equal duration, leaving the last one open. */
+export const splitWindows = (since: string, until: string, count: number): SyncWindow[] => {
+	const start = +new Date(since);
+	const step = Math.max(+new Date(until) - start, 0) / Math.max(count, 1);
+	const windows: SyncWindow[] = [];
+	for (let i = 0; i < count; i++) {
+		windows.push({
+			since: new Date(start + i * step).toISOString(),
+			until: i < count - 1 ? new Date(start + (i + 1) * step).toISOString() : undefined,
+		});
+	}
+	return windows;
+};
+
+/** Rewrite a JSONL dump with one line per issue number, keeping the most recently updated. */
+export const mergeIssues = (path: string) => {
+	if (!existsSync(path)) return 0;
+
+	const issues = new Map<number, { updatedAt: number; line: string }>();
+	for (const line of readFileSync(path, { encoding: 'utf8' }).split('\n')) {
+		if (!line.trim()) continue;
+		const issue = JSON.parse(line) as Partial<SyncedIssue>;
+		const updatedAt = issue.updatedAt || 0;
+		const existing = issues.get(issue.number as number);
+		if (!existing || existing.updatedAt <= updatedAt) {
+			issues.set(issue.number as number, { updatedAt, line });
+		}
+	}
+
+	const lines = [...issues.entries()].sort(([a], [b]) => a - b).map(([, issue]) => issue.line);
+	writeAtomic(path, lines.length ? lines.join('\n') + '\n' : '');
+	return lines.length;
+};
+
+/** Pauses requests while the remaining GraphQL quota is within the reserve. */
+export class RateLimiter {
+	private remaining = Infinity;
+	private resetAt = 0;
+
+	constructor(private reserve = RATE_LIMIT_RESERVE) {}
+
+	update(rateLimit: RateLimit) {
+		this.remaining = rateLimit.remaining;
+		this.resetAt = +new Date(rateLimit.resetAt);
+	}
+
+	async wait() {
+		while (this.remaining <= this.reserve) {
+			const delay = Math.max(this.resetAt - Date.now(), 0) + 1000;
+			safeLog('rate limit reserve reached, waiting ms', delay);
+			await new Promise((resolve) => setTimeout(resolve, delay));
+			if (Date.now() >= this.resetAt) this.remaining = Infinity;
+		}
+	}
+}
+
+/**
+ * Fetch every issue updated since the last sync into `dir`/issues.json, keeping
+ * progress in `dir`/issues.state.json.
+ * `fetchPage` loads one page of issues updated at or after `window.since`,
+ * oldest first, starting after `window.cursor`. `getStart` gives the start of
+ * the first sync, when there is no earlier one to continue from.
+ */
+export const syncIssues = async <T extends SyncedIssue>(
+	dir: string,
+	fetchPage: (window: SyncWindow) => Promise<SyncPage<T>>,
+	getStart: () => Promise<string>,
+	{ concurrency = SYNC_CONCURRENCY, reserve = RATE_LIMIT_RESERVE }: SyncOptions = {},
+) => {
+	const dumpPath = join(dir, 'issues.json');
+	const statePath = join(dir, 'issues.state.json');
+	const state = readSyncState(statePath);
+	if (state.pending) {
+		safeLog('resuming sync started at', state.pending.startedAt);
+	} else {
+		const startedAt = new Date().toISOString();
+		const since = state.updatedAt || (await getStart());
+		safeLog('syncing issues updated since', since);
+		state.pending = { startedAt, windows: splitWindows(since, startedAt, concurrency) };
+		writeSyncState(statePath, state);
+	}
+
+	const pending = state.pending;
+	const limiter = new RateLimiter(reserve);
+	let fetched = 0;
+
+	await mapWithConcurrency(pending.windows.slice(), concurrency, async (window) => {
+		const until = window.until ? +new Date(window.until) : Infinity;
+		for (;;) {
+			await limiter.wait();
+			const page = await fetchPage(window);
+			limiter.update(page.rateLimit);
+
+			const issues = page.issues.filter((issue) => issue.updatedAt < until);
+			if (issues.length) {
+				appendFileSync(dumpPath, issues.map((issue) => JSON.stringify(issue)).join('\n') + '\n');
+				fetched += issues.length;
+			}
+
+			// Pages are ordered by updatedAt, so reaching `until` finishes the window.
+			const done = !page.hasNextPage || !page.endCursor || issues.length < page.issues.length;
+			if (done) {
+				pending.windows.splice(pending.windows.indexOf(window), 1);
+			} else {
+				window.cursor = page.endCursor as string;
+			}
+			writeSyncState(statePath, state);
+
+			safeLog('fetched issues', fetched, 'quota', page.rateLimit.remaining);
+			if (done) return;
+		}
+	});
+
+	const total = mergeIssues(dumpPath);
+	writeSyncState(statePath, { updatedAt: pending.startedAt });
+	safeLog('synced issues', fetched, 'total', total);
+};
@@ -4,7 +4,7 @@
  *  Licensed under the MIT License. See LICENSE in the project root for license information.
  *--------------------------------------------------------------------------------------------*/
 Object.defineProperty(exports, "__esModule", { value: true });
-exports.readAccountsFromBlobStorage = exports.safeLog = exports.logErrorToIssue = exports.errorLoggingIssue = exports.getRateLimit = exports.daysAgoToHumanReadbleDate = exports.daysAgoToTimestamp = exports.isInsiderFrozen = exports.loadLatestRelease = exports.normalizeIssue = exports.getRequiredInput = exports.getInput = void 0;
+exports.readAccountsFromBlobStorage = exports.mapWithConcurrency = exports.safeLog = exports.logErrorToIssue = exports.errorLoggingIssue = exports.getRateLimit = exports.daysAgoToHumanReadbleDate = exports.daysAgoToTimestamp = exports.isInsiderFrozen = exports.loadLatestRelease = exports.normalizeIssue = exports.getRequiredInput = exports.getInput = void 0;
 const core = require("@actions/core");
 const github_1 = require("@actions/github");
 const storage_blob_1 = require("@azure/storage-blob");
@@ -120,6 +120,20 @@ const safeLog = (message, ...args) => {
     console.log(clean(message), ...args.map(clean));
 };
 exports.safeLog = safeLog;
+/** Map `items` through `fn` with at most `limit` calls in flight, keeping the results in order. */
+const mapWithConcurrency = async (items, limit, fn) => {
+    const results = new Array(items.length);
+    let next = 0;
+    const worker = async () => {
+        while (next < items.length) {
+            const index = next++;
+            results[index] = await fn(items[index], index);
+        }
+    };
+    await Promise.all(Array.from({ length: Math.min(Math.max(limit, 1), items.length) }, worker));
+    return results;
+};
+exports.mapWithConcurrency = mapWithConcurrency;
 /**
  * Reads from blob storage the JSON file including the mapping of GitHub usernames to VSTS and Slack usernames.
  * @param connectionString The connection string for the blob storage
@@ -138,6 +138,24 @@ export const safeLog = (message: string, ...args: (string | number | string[])[]
 	console.log(clean(message), ...args.map(clean));
 };
 
+/** Map `items` through `fn` with at most `limit` calls in flight, keeping the results in order. */
+export const mapWithConcurrency = async <T, R>(
+	items: T[],
+	limit: number,
+	fn: (item: T, index: number) => Promise<R>,
+): Promise<R[]> => {
+	const results: R[] = new Array(items.length);
+	let next = 0;
+	const worker = async () => {
+		while (next < items.length) {
+			const index = next++;
+			results[index] = await fn(items[index], index);
+		}
+	};
+	await Promise.all(Array.from({ length: Math.min(Math.max(limit, 1), items.length) }, worker));
+	return results;
+};
+
 export interface Accounts {
 	github: string;
 	slack: string;